@@ -6,324 +6,57 @@
 
 
 import json
-import copy
-import time
 import sys
-import random
+import time
 import os
 import os.path
+import argparse
 import traceback
-import fontpicker
-from tkinter.tix import *
-import tkinter.ttk
-import tkinter.colorchooser
-import tkinter.filedialog
+from collections import Counter
+from timing import STARTUP
+from drawpool import DrawPool, MAX_BATCH_SIZE
+from philox import PhiloxRandom
+from rollingsequence import RollingSequence
+from candidatelist import MappedCandidateList
+from framescheduler import FrameScheduler
+from mainthread import MainThreadQueue
+from imagecache import BackgroundImageCache
+from settingsmodel import Settings
+from resultgrid import ResultGrid
+from renderers import LabelRenderer, CanvasRenderer
+from reelstop import ReelStop, REEL_STEPS
+from journal import DrawJournal, list_fingerprint
+from masking import MaskCache
+from merkle import MerkleTree
+from attributes import AttributeIndex, parse_filter, format_filter
+from listwatcher import ListWatcher
+import tkinter.messagebox
 from tkinter import *
-from PIL import ImageTk, Image
-from functools import partial
 
 
-
-ROLLING_INTERVAL = 0.005  # sec
+ROLLING_FPS = 60
+RESULT_GRID_FONT_SIZE = 20
 USER_SETTING_FILE = '../config/user.cfg'
 DEFAULT_SETTING_FILE = '../config/default.cfg'
 SETTING_ICON = '../res/settings.png'
 DEF_BG_IMAGE = '../res/bg.png'
+LIST_FILE = '../LIST.txt'
+JOURNAL_FILE = '../journal/draw.journal'
+SNAPSHOT_FILE = '../journal/draw.snapshot'
+COMMITMENT_FILE = '../journal/commitment.json'
+PROOFS_FILE = '../journal/proofs.jsonl'
+DRAW_STREAM = 0
+DISPLAY_STREAM = 1
 
 root_dir = os.path.dirname(os.path.abspath(sys.argv[0]))
 print('root_dir', root_dir)
 os.chdir(root_dir)
 
-
-class SettingWindow:
-    def __init__(self, parent):
-
-        self.dirty = False
-
-        self.mute_notify = False
-
-        self.current_row = 0
-
-        self.settings = copy.deepcopy(parent.settings)
-
-        self.controls = {}
-
-        self.parent = parent
-
-        self.root = tkinter.tix.Toplevel()
-        self.root.transient(parent.root)
-
-        self.root.resizable(0, 0)
-
-        self.root.protocol('WM_DELETE_WINDOW', self.on_cancel)
-
-        self.frame = Frame(self.root)
-
-        for s in self.parent.settings:
-            self.create_option(s)
-
-        self.separator = tkinter.ttk.Separator(self.frame)
-        self.separator.grid(row=self.current_row, column=0, columnspan=2, sticky='ew', pady=20)
-        self.current_row += 1
-
-        self.button_frame = Frame(self.frame)
-
-        self.default_button = Button(self.button_frame, text='Default', command=self.on_default).grid(row=0, column=0,
-                                                                                                      padx=4, pady=10,
-                                                                                                      sticky=S)
-        self.cancel_button = Button(self.button_frame, text='Cancel', command=self.on_cancel).grid(row=0, column=1,
-                                                                                                   padx=4, pady=10,
-                                                                                                   sticky=S)
-        self.save_button = Button(self.button_frame, text='Save', command=self.on_save).grid(row=0, column=2, padx=4,
-                                                                                             pady=10, sticky=S)
-
-        self.button_frame.grid(row=self.current_row, column=1)
-
-        self.frame.pack(padx=8, pady=8)
-
-        self.update_title()
-
-        # self.set_to_center()
-
-    def set_to_center(self):
-        self.root.update_idletasks()
-        width = self.root["width"] != 0 and self.root["width"] or self.root.winfo_width()
-        height = self.root["height"] != 0 and self.root["height"] or self.root.winfo_height()
-        win_width, win_height = self.root.winfo_screenwidth(), self.root.winfo_screenheight()
-        self.root.geometry(
-            '%dx%d+%d+%d' % (width, height, (win_width / 2) - (width / 2), (win_height / 2) - (height / 2)))
-
-    def create_option(self, opt):
-        t = opt[1]
-        if t == 'int':
-            c, v = self.create_int_option(opt[0], opt[2])
-        elif t == 'text':
-            c, v = self.create_text_option(opt[0], opt[2])
-        elif t == 'font':
-            c, v = self.create_font_option(opt[0], opt[2])
-        elif t == 'color':
-            c, v = self.create_color_option(opt[0], opt[2])
-        elif t == 'path':
-            c, v = self.create_path_option(opt[0], opt[2])
-        else:
-            raise Exception('Unknown option type', opt)
-
-        self.controls[opt[0]] = (c, v)
-
-    def create_int_option(self, name, v):
-        value = IntVar()
-        value.set(v[2])
-        value.trace("w", partial(self.on_int_variable, name))
-
-        left = Label(self.frame, text=name, anchor=W)
-        right = Scale(self.frame, orient=HORIZONTAL, variable=value, from_=v[0], to=v[1])
-        left.grid(row=self.current_row, column=0, sticky=E + W, pady=0)
-        right.grid(row=self.current_row, column=1, sticky=E + W, pady=0)
-
-        self.current_row += 1
-
-        return right, value
-
-    def create_text_option(self, name, v):
-        value = StringVar()
-        value.set(v)
-        value.trace("w", partial(self.on_text_variable, name))
-
-        left = Label(self.frame, text=name, anchor=W)
-        right = Entry(self.frame, textvariable=value)
-        left.grid(row=self.current_row, column=0, sticky=E + W, pady=0)
-        right.grid(row=self.current_row, column=1, sticky=E + W, pady=0)
-
-        self.current_row += 1
-
-        return right, value
-
-    def create_font_option(self, name, v):
-        value = StringVar()
-        value.set(v)
-        value.trace("w", partial(self.on_font_variable, name))
-
-        left = Label(self.frame, text=name, anchor=W)
-        right = Button(self.frame, text=v, command=partial(self.on_font_button, name))
-        left.grid(row=self.current_row, column=0, sticky=E + W, pady=0)
-        right.grid(row=self.current_row, column=1, sticky=E + W, pady=0)
-
-        self.current_row += 1
-
-        return right, value
-
-    def create_color_option(self, name, v):
-        value = StringVar()
-        value.set(v)
-        value.trace("w", partial(self.on_color_variable, name))
-
-        left = Label(self.frame, text=name, anchor=W)
-        right = Button(self.frame, bg=value.get(), width=4, command=partial(self.on_color_button, name))
-        left.grid(row=self.current_row, column=0, sticky=E + W, pady=0)
-        right.grid(row=self.current_row, column=1, sticky=E + W, pady=0)
-
-        self.current_row += 1
-
-        return right, value
-
-    def create_path_option(self, name, v):
-        value = StringVar()
-
-        value.set(v)
-        value.trace("w", partial(self.on_path_variable, name))
-
-        left = Label(self.frame, text=name, anchor=W)
-        right = Button(self.frame, textvariable=value, command=partial(self.on_path_button, name))
-        left.grid(row=self.current_row, column=0, sticky=E + W, pady=0)
-        right.grid(row=self.current_row, column=1, sticky=E + W, pady=0)
-
-        self.current_row += 1
-
-        return right, value
-
-    def on_int_variable(self, name, *args):
-        c, v = self.controls[name]
-        self.set_opt_int(name, v.get())
-
-        self.apply_prop_changed()
-
-    def on_text_variable(self, name, *args):
-        c, v = self.controls[name]
-        self.set_opt(name, v.get())
-
-        self.apply_prop_changed()
-
-    def on_font_variable(self, name, *args):
-        c, v = self.controls[name]
-        self.set_opt_font(name, v.get())
-        c.configure(text=v.get())
-
-        self.apply_prop_changed()
-
-    def on_color_variable(self, name, *args):
-        c, v = self.controls[name]
-        self.set_opt(name, v.get())
-        c.configure(bg=v.get())
-
-        self.apply_prop_changed()
-
-    def on_path_variable(self, name, *args):
-        c, v = self.controls[name]
-        self.set_opt(name, v.get())
-        c.configure(text=v.get())
-
-        self.apply_prop_changed()
-
-    def update_control_value(self, t, name, value):
-        print('update_control_value', t, name, value)
-        c, v = self.controls[name]
-        if t == 'int':
-            v.set(value[2])
-        elif t in ['text', 'font', 'color', 'path']:
-            v.set(value)
-        else:
-            raise Exception('Unknown option type')
-
-    def set_opt(self, n, v):
-        for i, values in enumerate(self.settings):
-            if values[0] == n:
-                self.settings[i][2] = v
-                return
-
-    def set_opt_int(self, n, v):
-        for i, values in enumerate(self.settings):
-            if values[0] == n:
-                self.settings[i][2][2] = v
-                return
-
-    def set_opt_font(self, n, v):
-        for i, values in enumerate(self.settings):
-            if values[0] == n:
-                self.settings[i][2] = eval(v)
-                return
-
-    def get_opt(self, n):
-        for i, values in enumerate(self.settings):
-            if values[0] == n:
-                return values[2]
-
-    def on_font_button(self, name):
-        s = self.get_opt(name)
-        f = fontpicker.askChooseFont(self.root, defaultfont=font.Font(font=tuple(s)))
-        if f:
-            c, v = self.controls[name]
-            v.set(f)
-
-    def on_color_button(self, name):
-        color = tkinter.colorchooser.askcolor(initialcolor=self.get_opt(name))[1]
-        if color:
-            c, v = self.controls[name]
-            v.set(color)
-
-    def on_path_button(self, name):
-        file_path = tkinter.filedialog.askopenfilename(filetypes=(("Image files", "*.*"),))
-        print(file_path)
-        if not len(file_path):
-            return
-        try:
-            image = Image.open(file_path)
-            ImageTk.PhotoImage(image)
-        except:
-            tkinter.messagebox.showerror(title='Image load error',
-                                         message='Invalid image, please choose a valid image file')
-            return
-
-        c, v = self.controls[name]
-        v.set(os.path.abspath(file_path))
-
-    def on_cancel(self):
-        if self.dirty:
-            if not tkinter.messagebox.askokcancel("Quit", "Do you want to quit without saving?"):
-                return
-
-            self.settings = copy.deepcopy(self.parent.settings)
-            self.apply_prop_changed()
-
-        self.parent.set_setting_button_enabled(True)
-        self.root.destroy()
-
-    def on_default(self):
-        self.settings = copy.deepcopy(self.parent.def_settings)
-
-        self.mute_notify = True
-        for s in self.settings:
-            n = s[0]
-            t = s[1]
-            v = s[2]
-            self.update_control_value(t, n, v)
-        self.mute_notify = False
-
-        self.apply_prop_changed()
-
-    def on_save(self):
-        self.parent.settings = self.settings
-        self.parent.write_config_file(USER_SETTING_FILE, self.parent.settings)
-        self.parent.set_setting_button_enabled(True)
-        self.root.destroy()
-
-    def apply_prop_changed(self):
-        if self.mute_notify:
-            return
-
-        self.dirty = True
-        self.update_title()
-        #print('on_prop_changed')
-        self.parent.on_setting_changed(self.settings)
-
-    def update_title(self):
-        if self.dirty:
-            self.root.title('Settings *')
-        else:
-            self.root.title('Settings')
+STARTUP.mark('imports')
 
 
 class RollingApp(object):
-    def __init__(self):
+    def __init__(self, headless=False, renderer='label'):
         self.setting_names = [('Background image path', 'path', '../image.jpg'),  # 0
                               ('Background color', 'color', '#000000'),  # 1
                               ('Welcome text', 'text', 'Lucky Draw!'),  # 2
@@ -349,63 +82,137 @@ class RollingApp(object):
 
         self.visible_right = 5
 
-        self._max_index = 0
+        # winners come from the draw stream only, the rolling names from the
+        # display stream, so a journal seed replays every draw exactly
+        self.seed = None
+        self.rng = PhiloxRandom(stream=DRAW_STREAM)
+        self.rolling = RollingSequence(self.rng.spawn(DISPLAY_STREAM))
+
+        self.pool = DrawPool(rng=self.rng)
 
-        self.orig_candidates = []
-        self.candidates = []
+        # attribute columns of the list, and the eligible part of the pool
+        # while a prize is drawn with a filter. eligible_filter decides, the
+        # eligible pool is dropped when the live set changes and built again
+        self.attributes = None
+        self.eligible = None
+        self.eligible_filter = ''
 
         self.lucky_index = -1
 
+        self.batch_winners = []
+
+        # slot machine stop, off with --instant-stop
+        self.reel_stop = True
+        # the playing reel, None when no reel is playing
+        self._reel = None
+        self._reel_winners = None
+
+        self.masks = MaskCache()
+        self.masks.set_visible(self.visible_left, self.visible_right)
+
+        self.journal = DrawJournal(JOURNAL_FILE, SNAPSHOT_FILE)
+
+        # Merkle commitment to the list, built on load with --commit
+        self.commit_list = False
+        self.merkle = None
+
         # self.write_config_file(DEFAULT_SETTING_FILE, self.setting_names)
         # self.write_config_file(USER_SETTING_FILE, self.setting_names)
 
         self.settings = {}
         self.settings = self.load_settings()
-        self.def_settings = self.load_def_settings()
+        self._def_settings = None
+        STARTUP.mark('settings')
 
         self._lucky_result = self.get_setting(2)
+        self._lucky_id = -1
+
+        self._shown_info = None
+
+        self.root = None
+
+        self.renderer_name = renderer
+        self.renderer = None
+
+        self.show_timing = False
+
+        # set by --profile
+        self.instruments = None
 
-        self.stop = False
+        # set when the pool is owned by a pool server
+        self.pool_client = None
+        self.pool_address = None
 
-        self._draw_thread = None
+        # remote control server, started when an address is given
+        self.remote = None
+        self.remote_address = None
+        self.remote_token = None
 
-        self.root = tkinter.tix.Tk()
+        # picks up changes to LIST.txt while the app runs, off with --no-watch
+        self.watch_list = True
+        self.list_watcher = None
+
+        if not headless:
+            self.build_ui()
+
+    def build_ui(self):
+        self.root = Tk()
         self.root.title('Lucky Draw Program')
+        STARTUP.mark('tk root')
 
         # position limits
-        self.settings[3][2][1] = self.def_settings[3][2][1] = self.root.winfo_screenheight()
+        self.settings[3][2][1] = self.root.winfo_screenheight()
 
         self.use_mask = IntVar()
 
+        self.batch_size = IntVar(value=1)
+
         self.to_full_screen()
 
+        self._frames = FrameScheduler(self.root, self.rolling_update, ROLLING_FPS)
+
         #self.root.attributes('-topmost', True)
 
-        try:
-            self.image = Image.open(self.get_setting(0))
-            self.bg_image = ImageTk.PhotoImage(self.image)
-        except:
-            self.image = Image.open(DEF_BG_IMAGE)
-            self.bg_image = ImageTk.PhotoImage(self.image)
+        self.tasks = MainThreadQueue(self.root)
 
-        self.bg_label = Label(self.root, image=self.bg_image)
+        screen_size = (self.root.winfo_screenwidth(), self.root.winfo_screenheight())
+        self.bg_images = BackgroundImageCache(self.tasks, screen_size, DEF_BG_IMAGE)
 
-        self.bg_label.place(x=0, y=0, relwidth=1, relheight=1)
+        if self.renderer_name == 'canvas':
+            self.renderer = CanvasRenderer(self.root)
+        else:
+            self.renderer = LabelRenderer(self.root)
 
-        self.info_label = Label(self.root, font=self.get_setting(4), fg='red')
-        # self.info_label.pack(side=TOP, pady=self.get_setting(3)[2])
-        self.info_label.place(x=self.root.winfo_screenwidth() / 2, y=self.get_setting(3)[2], anchor=CENTER)
+        # built on the first batch result
+        self.result_grid = None
 
         self.config_frame = Frame(self.root)
 
-        self.check_box = Checkbutton(self.config_frame, text='Mask', variable=self.use_mask)
+        self.batch_spinbox = Spinbox(self.config_frame, from_=1, to=MAX_BATCH_SIZE, width=4,
+                                     textvariable=self.batch_size)
+        self.batch_spinbox.pack(side=RIGHT)
+
+        self.batch_label = Label(self.config_frame, text='Batch')
+        self.batch_label.pack(side=RIGHT)
+
+        # e.g. "site=Berlin,Munich; dept=Sales", empty for everyone
+        self.filter_text = StringVar()
+        self.filter_entry = Entry(self.config_frame, width=24, textvariable=self.filter_text)
+        self.filter_entry.pack(side=RIGHT)
+        # Return hands the keys back to the space bar
+        self.filter_entry.bind('<Return>', lambda event: self.root.focus_set())
+
+        self.filter_label = Label(self.config_frame, text='Eligible')
+        self.filter_label.pack(side=RIGHT)
+
+        self.check_box = Checkbutton(self.config_frame, text='Mask', variable=self.use_mask,
+                                     command=self.update_info_display)
         self.check_box.pack(side=RIGHT)
 
         self._reset_button = Button(self.config_frame, relief=GROOVE, text='Reset', command=self.on_reset_button)
         self._reset_button.pack(side=RIGHT)
 
-        self.setting_image = Image.open(SETTING_ICON)
-        self.tk_setting_image = ImageTk.PhotoImage(self.setting_image)
+        self.tk_setting_image = PhotoImage(file=SETTING_ICON)
 
         self._setting_button = Button(self.config_frame, relief=GROOVE, image=self.tk_setting_image, text='Settings',
                                       command=self.on_setting_button)
@@ -425,14 +232,72 @@ class RollingApp(object):
 
         self.root.protocol("WM_DELETE_WINDOW", self.on_delete)
 
+        STARTUP.mark('widgets')
+
     def rolling_update(self):
-        if not self.stop:
-            self.lucky_index = self.get_rand_index(self._max_index)
-            self._lucky_result = self.candidates[self.lucky_index]
+        if self._reel is not None:
+            self.play_reel()
+            return
+
+        self._lucky_id = self.rolling_id()
+        self._lucky_result = self.pool.candidates[self._lucky_id]
 
         self.update_info_display()
 
-        self.root.after(10, self.rolling_update)
+        if self.renderer.caches_text:
+            # lay out the next name while Tk is idle until the next frame
+            self.root.after_idle(self.prepare_next_frame)
+
+    def start_reel(self, winners):
+        # winners are drawn already, the reel only slows down onto the first one
+        if not self.reel_stop or not self._frames.running:
+            self.show_result(winners)
+            return
+
+        reel = [self.rolling_id() for _ in range(REEL_STEPS if self.drawing_pool().can_draw() else 0)]
+        reel.append(winners[0])
+        if self.use_mask.get():
+            names = [self.get_masked(candidate_id) for candidate_id in reel]
+        else:
+            names = [self.pool.candidates[candidate_id] for candidate_id in reel]
+        if self.renderer.caches_text:
+            for name in names:
+                self.renderer.prepare(name)
+
+        self._reel = ReelStop(names, ROLLING_FPS)
+        self._reel_winners = winners
+        self.draw_button.configure(state=DISABLED)
+
+    def play_reel(self):
+        name = self._reel.frame()
+        if name is None:
+            winners = self._reel_winners
+            self._reel = None
+            self._reel_winners = None
+            self.draw_button.configure(state=NORMAL)
+            self.show_result(winners)
+            return
+
+        if name != self._shown_info:
+            self._shown_info = name
+            self.renderer.show(name)
+
+    def rolling_id(self, peek=False):
+        # a live candidate for the rolling display, only eligible ones while a filter is set
+        next_index = self.rolling.peek if peek else self.rolling.next_index
+        if self.eligible_filter:
+            eligible = self.eligible_pool()
+            return eligible.candidate_id(next_index(eligible.total))
+        return self.pool.candidate_id(next_index(len(self.pool)))
+
+    def prepare_next_frame(self):
+        if self.state != self.STATES[1] or not self.drawing_pool().can_draw():
+            return
+        candidate_id = self.rolling_id(peek=True)
+        if self.use_mask.get():
+            self.renderer.prepare(self.get_masked(candidate_id))
+        else:
+            self.renderer.prepare(self.pool.candidates[candidate_id])
 
     def update_info_display(self):
         if self.state == self.STATES[0]:
@@ -443,27 +308,68 @@ class RollingApp(object):
             else:
                 info = self._lucky_result
         elif self.state == self.STATES[2]:
-            if self.use_mask.get():
+            if len(self.batch_winners) > 1:
+                info = self.winner_prefix
+                self.update_result_grid()
+            elif self.use_mask.get():
                 info = self.winner_prefix + '\n' + self.get_masked()
             else:
                 info = self.winner_prefix + '\n' + self._lucky_result
         else:
             raise Exception('Invalid state')
 
-        self.info_label.configure(text=info)
+        if info != self._shown_info:
+            self._shown_info = info
+            self.renderer.show(info)
+
+    def update_result_grid(self):
+        if self.use_mask.get():
+            names = [self.get_masked(winner) for winner in self.batch_winners]
+        else:
+            names = [self.pool.candidates[winner] for winner in self.batch_winners]
+        self.result_grid.show(names, self.result_grid.page)
+
+    def get_result_grid(self):
+        if self.result_grid is None:
+            self.result_grid = ResultGrid(self.root)
+            self.configure_result_grid(self.settings)
+        return self.result_grid
+
+    def configure_result_grid(self, settings):
+        self.result_grid.configure(font=(settings[4][2][0], RESULT_GRID_FONT_SIZE, 'bold'),
+                                   fg=settings[5][2], bg=settings[1][2])
 
     def on_setting_button(self):
+        from settingwindow import SettingWindow
+
         self.set_setting_button_enabled(False)
         SettingWindow(self)
 
     def on_reset_button(self):
+        if self.pool_client:
+            self.send_pool_command({'cmd': 'reset'})
+            return
+
         self.lucky_index = -1
-        self.candidates = copy.copy(self.orig_candidates)
-        self._max_index = len(self.candidates) - 1
+        self.pool.reset()
+        self.eligible = None  # built again with the returned winners when it is used
+        self.journal.record_reset(self.pool)
+        self.notify_remote({'event': 'reset'})
 
     def get_setting(self, index):
         return self.settings[index][2]
 
+    @property
+    def def_settings(self):
+        if self._def_settings is None:
+            self._def_settings = self.load_def_settings()
+            if self.root is not None:
+                self._def_settings[3][2][1] = self.root.winfo_screenheight()
+        return self._def_settings
+
+    def save_settings(self):
+        self.write_config_file(USER_SETTING_FILE, self.settings)
+
     @staticmethod
     def write_config_file(name, settings):
         with open(name, 'wt+', encoding='utf-8') as out:
@@ -471,20 +377,14 @@ class RollingApp(object):
 
     def settings_valid(self, settings):
         for n in self.setting_names:
-            valid = False
-            for s in settings:
-                if s[0] == n[0]:
-                    valid = True
-                    break
-
-            if not valid:
+            if n[0] not in settings:
                 return False
 
         return True
 
     def load_config_file(self, name):
         with open(name, 'rt', encoding='utf-8') as config:
-            settings = json.load(config)
+            settings = Settings(json.load(config))
 
             # print(settings)
 
@@ -519,100 +419,375 @@ class RollingApp(object):
         h = self.root.winfo_screenheight()
         self.root.geometry("%dx%d+0+0" % (w, h))
 
+    def connect_pool_server(self):
+        from poolserver import PoolClient
+
+        self.pool_client = PoolClient(self.pool_address, self.tasks, self.on_pool_event)
+        self.pool_client.connect()
+        print('Connected to pool server', self.pool_address)
+
+    def send_pool_command(self, message):
+        try:
+            self.pool_client.send(message)
+        except OSError:
+            self.disconnect_pool_server('Lost the connection to the pool server.')
+
+    def on_pool_event(self, message):
+        event = message.get('event')
+        if event == 'welcome':
+            if message['list'] != list_fingerprint(self.pool.candidates):
+                self.disconnect_pool_server('The pool server uses a different candidate list.')
+                return
+            self.pool.reset()
+            for winner in reversed(message['removed']):
+                self.pool.remove_id(winner)
+            if message['state'] == self.STATES[1]:
+                self.start_rolling()
+        elif event == 'state' and message['state'] == self.STATES[1]:
+            self.start_rolling()
+        elif event == 'winners':
+            # mirror the server so the rolling display skips winners
+            for winner in message['ids']:
+                if self.pool.is_live(winner):
+                    self.pool.remove_id(winner)
+            if message['ids']:
+                self.start_reel(message['ids'])
+        elif event == 'reset':
+            self.lucky_index = -1
+            self.pool.reset()
+            self.notify_remote({'event': 'reset'})
+        elif event == 'error':
+            tkinter.messagebox.showwarning('Pool server', message['message'])
+        elif event == 'disconnected':
+            self.disconnect_pool_server('Lost the connection to the pool server.')
+
+    def disconnect_pool_server(self, reason):
+        if self.pool_client is None:
+            return
+        self.pool_client.close()
+        self.pool_client = None
+        self._frames.stop()
+        tkinter.messagebox.showerror('Pool server', reason + '\nThis station can no longer draw.')
+        self.draw_button.configure(state=DISABLED)
+        self._reset_button.configure(state=DISABLED)
+
+    def on_remote_command(self, message):
+        cmd = message.get('cmd')
+        if cmd == 'begin':
+            if self.state != self.STATES[1]:
+                if 'filter' in message:
+                    self.filter_text.set(message['filter'])
+                self.draw_button.invoke()
+        elif cmd == 'stop':
+            if self.state == self.STATES[1]:
+                self.draw_button.invoke()
+        elif cmd == 'reset':
+            self._reset_button.invoke()
+        elif cmd != 'status':
+            return {'event': 'error', 'message': 'Unknown command %r' % cmd}
+
+        return {'event': 'ack', 'state': self.state, 'live': len(self.pool), 'total': self.pool.total,
+                'filter': self.eligible_filter, 'eligible': len(self.drawing_pool()),
+                'stopping': self._reel is not None, 'winners': [self.pool.candidates[i] for i in self.batch_winners]}
+
+    def notify_remote(self, message):
+        if self.remote:
+            self.remote.broadcast(message)
+
     def on_delete(self):
         if tkinter.messagebox.askokcancel("Quit", "Do you want to quit?"):
+            if self.instruments:
+                print('Profile written to', self.instruments.dump())
+            if self.remote:
+                self.remote.stop()
+            if self.pool_client:
+                self.pool_client.close()
+            self.journal.close(self.pool)
             self.root.destroy()
 
     def on_key(self, event):
+        if event.widget in (self.filter_entry, self.batch_spinbox) and event.keysym != 'Escape':
+            # typing a filter or a batch size
+            return
         if event.keysym == 'space':
             self.draw_button.invoke()
         elif event.keysym == 'Escape':
             self.on_delete()
+        elif event.keysym in ('Right', 'Next') and self.result_grid:
+            self.result_grid.next_page()
+        elif event.keysym in ('Left', 'Prior') and self.result_grid:
+            self.result_grid.prev_page()
 
-    @staticmethod
-    def is_valid_line(line):
-        if not len(line):
+    def read_candidates_list(self, list_name):
+        previous = self.pool.candidates
+
+        self.merkle = MerkleTree() if self.commit_list else None
+        self.attributes = AttributeIndex()
+        candidates = MappedCandidateList(list_name, self.merkle, self.attributes)
+        self.pool.load(candidates, candidates.weights)
+        # the attributes may be gone from the new list, BEGIN selects the filter again
+        self.eligible = None
+        self.eligible_filter = ''
+        self.masks.load(candidates)
+        if hasattr(previous, 'close'):
+            previous.close()
+
+        self.lucky_index = -1
+        print('max index is:', self.pool.max_index)
+        if self.merkle is not None:
+            self.publish_commitment()
+        if self.list_watcher is not None:
+            self.list_watcher.watch(candidates)
+
+    def on_list_changed(self, appended):
+        if appended and self.append_candidates():
+            return
+        if self.state == self.STATES[1] or self._reel is not None:
+            # candidate ids must not change under a running draw
+            self.list_watcher.recheck()
+            return
+        self.reload_candidates()
+
+    def append_candidates(self):
+        # only new lines at the end: index them and add them to the live pool
+        candidates = self.pool.candidates
+        added = candidates.extend()
+        if added is None:
             return False
+        if not added:
+            return True
+
+        self.pool.extend(len(candidates), candidates.weights)
+        self.eligible = None  # built again with the new eligible ids when it is used
+        self.masks.extend()
+        self.journal.record_grow(self.pool, list_fingerprint(candidates))
+        print('Added', added, 'candidates from', LIST_FILE + ', max index is:', self.pool.max_index)
+        if self.merkle is not None:
+            self.publish_commitment()
+        self.notify_remote({'event': 'list', 'added': added, 'live': len(self.pool), 'total': self.pool.total})
         return True
 
-    def read_candidates_list(self, list_name):
-        self.candidates = []
-        with open(list_name, 'r', encoding='utf-8') as in_file:
-            for line in in_file.readlines():
-                line = line.strip(' \n\r')
-                line = line.strip('\ufeff') # BOM
-                if self.is_valid_line(line):
-                    self.candidates.append(line)
+    def reload_candidates(self):
+        # earlier lines changed, so the ids did too: read the whole list again
+        # and remove the winners again, found by name, oldest first. The names
+        # come from the journal, or from the previous list without one
+        previous = self.pool.candidates
+        journaled = self.journal.fingerprint is not None
+        names = self.journal.winner_names() if journaled else {}
+        winners = [(winner, names.get(winner) or previous[winner]) for winner in reversed(self.pool.winners())]
+        round_number = self.journal.round
+        self.journal.close(self.pool)
+
+        self.read_candidates_list(LIST_FILE)
+        candidates = self.pool.candidates
+        if journaled:
+            # the old journal no longer matches the list and is archived
+            self.journal.open(self.pool, list_fingerprint(candidates), self.rng)
+            self.journal.round = round_number
+
+        wanted = Counter(name for _, name in winners)
+        found = {}
+        for candidate_id in range(len(candidates)):
+            name = candidates[candidate_id]
+            if wanted[name]:
+                wanted[name] -= 1
+                found.setdefault(name, []).append(candidate_id)
+
+        moved = {}
+        for winner, name in winners:
+            if found.get(name):
+                candidate_id = found[name].pop(0)
+                moved[winner] = candidate_id
+                self.pool.remove_id(candidate_id)
+                self.journal.record_carry(self.pool, candidate_id, name)
+
+        self.batch_winners = [moved[winner] for winner in self.batch_winners if winner in moved]
+        self._lucky_id = moved.get(self._lucky_id, -1)
+        print('Read', LIST_FILE, 'again:', len(moved), 'of', len(winners), 'winners are still removed')
+        self.notify_remote({'event': 'list', 'reloaded': True, 'live': len(self.pool), 'total': self.pool.total})
+        self.update_info_display()
 
-            #print(self.candidates)
+    def publish_commitment(self):
+        commitment = {'root': self.merkle.root.hex(), 'size': self.merkle.size, 'time': time.time()}
+        os.makedirs(os.path.dirname(COMMITMENT_FILE), exist_ok=True)
+        with open(COMMITMENT_FILE, 'wt', encoding='utf-8') as out:
+            json.dump(commitment, out, indent='\t')
+        print('Candidate list commitment:', commitment['root'], 'over', commitment['size'], 'candidates')
 
-            self.orig_candidates = copy.copy(self.candidates)
-            self.lucky_index = -1
-            self._max_index = len(self.candidates) - 1
-            print('max index is:', self._max_index)
+    def write_proofs(self, winners):
+        # one inclusion proof per winner, checked with `python merkle.py verify`
+        with open(PROOFS_FILE, 'at', encoding='utf-8') as out:
+            for winner in winners:
+                out.write(json.dumps(self.merkle.proof_record(winner), ensure_ascii=False) + '\n')
 
     def run(self):
         print('Starting the program')
-        random.seed()
-        print('Random seed set')
-        self.read_candidates_list('..\LIST.txt')
+        self.rng.seed(self.seed)
+        self.read_candidates_list(LIST_FILE)
+        STARTUP.mark('candidate list')
 
-        self.rolling_update()
+        if self.pool_address:
+            # winners are journaled by the pool server
+            self.connect_pool_server()
+        else:
+            replayed = self.journal.open(self.pool, list_fingerprint(self.pool.candidates), self.rng)
+            print('Resumed from journal:', replayed, 'events,', self.pool.total - len(self.pool), 'winners removed')
+        self.rolling = RollingSequence(self.rng.spawn(DISPLAY_STREAM))
+        print('Random seed', self.rng.seed_value)
+        STARTUP.mark('journal')
+
+        if self.watch_list and not self.pool_address:
+            # a pool server owns its list, stations do not reload theirs
+            self.list_watcher = ListWatcher(self.root, self.tasks, LIST_FILE, self.on_list_changed)
+            self.list_watcher.watch(self.pool.candidates)
+            self.list_watcher.start()
+
+        if self.remote_address:
+            from remotecontrol import RemoteControl
+
+            self.remote = RemoteControl(self.root, self.remote_address, self.on_remote_command, self.remote_token)
+            self.remote.start()
+            print('Remote control on', self.remote_address)
+
+        self.root.after_idle(self.on_first_paint)
 
         print('UI main loop')
         self.root.mainloop()
 
-    def update_info(self):
-        while True:
-            time.sleep(ROLLING_INTERVAL)
-            if self.state == self.STATES[0]:
-                continue
-            if self.state == self.STATES[1]:
-                if self.use_mask.get():
-                    info = self.get_masked()
-                else:
-                    info = self._lucky_result
-            elif self.state == self.STATES[2]:
-                if self.use_mask.get():
-                    info = self.winner_prefix + '\n' + self.get_masked()
-                else:
-                    info = self.winner_prefix + '\n' + self._lucky_result
-            else:
-                raise Exception('Invalid state')
-
-            self.info_label.configure(text=info)
+    def on_first_paint(self):
+        STARTUP.mark('first paint')
+        if self.show_timing:
+            print(STARTUP.report())
 
     def remove_winner_candidate(self):
-        self.candidates.pop(self.lucky_index)
-        self._max_index = len(self.candidates) - 1
+        # drawn at STOP, not taken from the last rolling frame, so the winner
+        # does not depend on frame timing and the journal can replay it
+        self.lucky_index = self.get_rand_index()
+        self._lucky_id = self.pool.candidate_id(self.lucky_index)
+        self._lucky_result = self.pool.candidates[self._lucky_id]
+
+        winner = self.pool.remove(self.lucky_index)
+        self.journal.record_win(self.pool, winner, self._lucky_result)
+
+    def remove_eligible_winner(self):
+        self.lucky_index = -1
+        self._lucky_id = self.eligible_pool().draw()
+        self._lucky_result = self.pool.candidates[self._lucky_id]
+        self.journal.record_win(self.pool, self._lucky_id, self._lucky_result, self.eligible_filter)
+
+    def draw_batch(self, count):
+        # journaled one by one, each entry keeps the generator position after its own draw
+        pool = self.drawing_pool()
+        winners = []
+        while len(winners) < count and pool.can_draw():
+            winner = pool.draw()
+            self.journal.record_win(self.pool, winner, self.pool.candidates[winner], self.eligible_filter)
+            winners.append(winner)
+        return winners
+
+    def drawing_pool(self):
+        return self.eligible_pool() if self.eligible_filter else self.pool
+
+    def eligible_pool(self):
+        # the pool of the filter of this round, built again after an append or a reset dropped it
+        if self.eligible is None:
+            self.eligible = self.pool.eligible(self.attributes.select(parse_filter(self.eligible_filter)))
+        return self.eligible
+
+    def select_eligible(self):
+        # builds the eligible pool for the filter typed in, False when the filter is not valid
+        try:
+            terms = parse_filter(self.filter_text.get())
+            spec = format_filter(terms)
+            if not terms:
+                self.eligible = None
+            elif self.eligible is None or spec != self.eligible_filter:
+                self.eligible = self.pool.eligible(self.attributes.select(terms))
+        except ValueError as e:
+            tkinter.messagebox.showwarning('Eligible', ' '.join(map(str, e.args)))
+            return False
+
+        self.eligible_filter = spec
+        return True
+
+    def get_batch_size(self):
+        try:
+            return max(1, min(self.batch_size.get(), MAX_BATCH_SIZE))
+        except TclError:
+            return 1
 
     def on_begin_rolling_button(self):
-        self.state = self.STATES[1]
+        if self.pool_client:
+            if self.filter_text.get().strip():
+                tkinter.messagebox.showwarning('Eligible', 'Filters are not supported with a pool server.')
+                return
+            self.send_pool_command({'cmd': 'begin'})
+            return
+
+        if not self.select_eligible():
+            return
+
+        if self.eligible_filter and not self.eligible.can_draw():
+            tkinter.messagebox.showwarning('No eligible candidates',
+                                           'Nobody left in the pool matches "%s".' % self.eligible_filter)
+            return
 
-        if not len(self.candidates):
+        if not self.pool.can_draw():
             tkinter.messagebox.showwarning('No more candidates',
                                            "No more candidates! Please use the reset button to reset.")
             return
 
-        self.stop = False
+        self.start_rolling()
+
+    def start_rolling(self):
+        self.state = self.STATES[1]
+        self.batch_winners = []
+        if self.result_grid:
+            self.result_grid.hide()
+        self._frames.start()
 
         self.draw_button.configure(text=self.get_setting(11))
         self.draw_button.configure(command=self.on_end_rolling_button)
+        self.notify_remote({'event': 'state', 'state': self.state, 'filter': self.eligible_filter})
 
     def on_end_rolling_button(self):
+        if self.pool_client:
+            self.send_pool_command({'cmd': 'stop', 'count': self.get_batch_size()})
+            return
+
+        if self._reel is not None:
+            return
+
+        self.journal.next_round()
+        if self.eligible_filter:
+            self.remove_eligible_winner()
+        else:
+            self.remove_winner_candidate()
+        self.start_reel([self._lucky_id] + self.draw_batch(self.get_batch_size() - 1))
+
+    def show_result(self, winners):
         self.state = self.STATES[2]
+        self._frames.stop()
+
+        self._lucky_id = winners[0]
+        self._lucky_result = self.pool.candidates[winners[0]]
+        self.batch_winners = winners
+        if self.merkle is not None:
+            self.write_proofs(winners)
 
-        self.stop = True
+        if len(self.batch_winners) > 1:
+            self.get_result_grid().show([], 0)
+            self.result_grid.place(relx=0.5, rely=0.55, anchor=CENTER)
 
-        self.remove_winner_candidate()
+        self.update_info_display()
 
         self.draw_button.configure(text=self.get_setting(10))
         self.draw_button.configure(command=self.on_begin_rolling_button)
+        self.notify_remote({'event': 'winners', 'ids': winners,
+                            'names': [self.pool.candidates[winner] for winner in winners]})
 
-    @staticmethod
-    def get_rand_index(max_index):
-        r = random.randint(0, max_index)
-        return r
+    def get_rand_index(self):
+        return self.pool.rand_index()
 
     def set_setting_button_enabled(self, enabled):
         if enabled:
@@ -620,55 +795,104 @@ class RollingApp(object):
         else:
             self._setting_button.configure(state=DISABLED)
 
-    def get_masked(self):
-        total = len(self._lucky_result)
-        if self.visible_left + self.visible_right >= total:
-            return self._lucky_result
+    def get_masked(self, candidate_id=None):
+        if candidate_id is None:
+            candidate_id = self._lucky_id
+        return self.masks.get(candidate_id)
 
-        left = self._lucky_result[0:self.visible_left]
-        if not self.visible_right:
-            right = ''
-        else:
-            right = self._lucky_result[-self.visible_right:]
+    def set_background_image(self, photo):
+        if photo is not self.renderer.bg_image:
+            self.renderer.set_background_image(photo)
 
-        mask_count = total - self.visible_left - self.visible_right
-        masked = left + mask_count * '*' + right
-        return masked
+    def on_setting_changed(self, settings, changed=None):
+        # changed holds the positions of the modified settings, None means all
+        if changed is None:
+            changed = range(len(settings))
+        changed = set(changed)
 
-    def on_setting_changed(self, settings):
-        try:
-            self.image = Image.open(settings[0][2])
-            self.bg_image = ImageTk.PhotoImage(self.image)
-        except:
-            self.image = Image.open(DEF_BG_IMAGE)
-            self.bg_image = ImageTk.PhotoImage(self.image)
+        # the cache key holds the file's mtime, so an image replaced on disk is decoded again
+        # even when the path did not change; a cache hit on the same image is a no-op
+        self.bg_images.request(settings[0][2], self.set_background_image)
 
-        self.bg_label.configure(image=self.bg_image, bg=settings[1][2])
+        if 1 in changed:
+            self.renderer.set_background_color(settings[1][2])
 
-        self.info_label.configure(font=settings[4][2], fg=settings[5][2], bg=settings[1][2])
-        self.winner_prefix = settings[6][2]
+        if changed & {4, 5}:
+            self.renderer.set_style(settings[4][2], settings[5][2])
 
-        self.draw_button.configure(font=settings[7][2], fg=settings[8][2], bg=settings[9][2])
+        if changed & {1, 4, 5} and self.result_grid:
+            self.configure_result_grid(settings)
 
-        if self.state == self.STATES[0]:
-            self.info_label['text'] = settings[2][2]
-            self.draw_button.configure(text=settings[10][2])
-        elif self.state == self.STATES[1]:
-            self.draw_button.configure(text=settings[11][2])
-        elif self.state == self.STATES[2]:
-            self.draw_button.configure(text=settings[10][2])
-        else:
-            raise Exception('Invalid state')
+        if 6 in changed:
+            self.winner_prefix = settings[6][2]
+
+        if changed & {7, 8, 9}:
+            self.draw_button.configure(font=settings[7][2], fg=settings[8][2], bg=settings[9][2])
 
-        self.visible_left = settings[12][2][2]
-        self.visible_right = settings[13][2][2]
+        if changed & {10, 11}:
+            if self.state == self.STATES[0]:
+                self.draw_button.configure(text=settings[10][2])
+            elif self.state == self.STATES[1]:
+                self.draw_button.configure(text=settings[11][2])
+            elif self.state == self.STATES[2]:
+                self.draw_button.configure(text=settings[10][2])
+            else:
+                raise Exception('Invalid state')
 
-        self.info_label.place(x=self.root.winfo_screenwidth() / 2, y=settings[3][2][2], anchor=CENTER)
+        if changed & {12, 13}:
+            self.visible_left = settings[12][2][2]
+            self.visible_right = settings[13][2][2]
+            self.masks.set_visible(self.visible_left, self.visible_right)
+
+        if 3 in changed:
+            self.renderer.set_position(self.root.winfo_screenwidth() / 2, settings[3][2][2])
+
+        if changed & {2, 6, 12, 13}:
+            self.update_info_display()
+
+
+def parse_args():
+    parser = argparse.ArgumentParser(description='Lucky draw program')
+    parser.add_argument('--timing', action='store_true', default=bool(os.environ.get('LUCKY_TIMING')),
+                        help='print how long each startup phase took (or set LUCKY_TIMING=1)')
+    parser.add_argument('--profile', action='store_true', default=bool(os.environ.get('LUCKY_PROFILE')),
+                        help='time the hot paths, F11 shows an overlay, F12 writes JSON (or set LUCKY_PROFILE=1)')
+    parser.add_argument('--connect', metavar='ADDRESS',
+                        help="draw from a pool server at 'host:port' or 'unix:/path' instead of locally")
+    parser.add_argument('--seed', type=int, help='seed the draw for a new journal, a resumed one keeps its seed')
+    parser.add_argument('--remote', metavar='ADDRESS',
+                        help="accept begin/stop/reset/status commands at 'host:port', e.g. 0.0.0.0:8643")
+    parser.add_argument('--remote-token', help='require this token in every remote command')
+    parser.add_argument('--commit', action='store_true',
+                        help='publish a Merkle root of the list and write a proof for every winner')
+    parser.add_argument('--no-watch', action='store_true',
+                        help='do not pick up candidates added to the list while the app runs')
+    parser.add_argument('--instant-stop', action='store_true', help='show the winner at once, without the reel')
+    parser.add_argument('--renderer', choices=('label', 'canvas'), default='label',
+                        help='canvas keeps laid out names for smoother rolling with large fonts')
+    return parser.parse_args()
 
 
 def main():
     try:
-        app = RollingApp()
+        args = parse_args()
+        instruments = None
+        if args.profile:
+            from instrument import Instruments
+            instruments = Instruments()
+            instruments.install(RollingApp)
+        app = RollingApp(renderer=args.renderer)
+        if instruments:
+            instruments.attach(app)
+            app.instruments = instruments
+        app.show_timing = args.timing
+        app.pool_address = args.connect
+        app.seed = args.seed
+        app.reel_stop = not args.instant_stop
+        app.watch_list = not args.no_watch
+        app.commit_list = args.commit
+        app.remote_address = args.remote
+        app.remote_token = args.remote_token
         app.run()
     except:
         tkinter.messagebox.showerror('Application Error', traceback.format_exc())
@@ -0,0 +1,125 @@
+# -*- coding: utf-8 -*-
+
+# Attribute index for per-prize eligibility filters
+#
+# A candidate line may carry attributes after the name and the ticket count,
+# one key=value per tab separated field:
+#     Alice<TAB>3<TAB>site=Berlin<TAB>dept=Sales
+#     Bob<TAB>site=Munich
+# The index is an inverted index, key -> value -> ascending candidate ids,
+# fed by the list scan like the Merkle tree, so it costs no second pass and
+# grows with appended lines. Keys and values match without case.
+#
+# A filter allows any of the listed values of a key and needs every key:
+#     site=Berlin,Munich; dept=Sales
+# Selecting it touches only the id lists of the named values, never the
+# whole list.
+
+
+from array import array
+from bisect import bisect_left
+
+
+def normalize(text):
+    return ' '.join(text.split()).casefold()
+
+
+def parse_filter(spec):
+    # "site=Berlin,Munich; dept=Sales" -> {'site': {'berlin', 'munich'}, 'dept': {'sales'}}
+    terms = {}
+    for term in spec.split(';'):
+        if not term.strip():
+            continue
+        key, sep, values = term.partition('=')
+        key = normalize(key)
+        wanted = {normalize(value) for value in values.split(',') if value.strip()}
+        if not sep or not key or not wanted:
+            raise ValueError('filter terms are written key=value[,value...]', term.strip())
+        # a key given twice must match both times
+        terms[key] = terms[key] & wanted if key in terms else wanted
+    return terms
+
+
+def format_filter(terms):
+    # the canonical text of parsed terms, as written to the journal
+    return '; '.join('%s=%s' % (key, ','.join(sorted(terms[key]))) for key in sorted(terms))
+
+
+def intersect(small, large):
+    # ids in both ascending arrays; binary search keeps a small selection from reading all of a large list
+    if len(small) * 16 < len(large):
+        found = []
+        low = 0
+        for candidate_id in small:
+            low = bisect_left(large, candidate_id, low)
+            if low == len(large):
+                break
+            if large[low] == candidate_id:
+                found.append(candidate_id)
+        return found
+    members = set(large)
+    return [candidate_id for candidate_id in small if candidate_id in members]
+
+
+class AttributeIndex(object):
+    def __init__(self):
+        self._postings = {}  # key -> {value: array of candidate ids}
+        self._fields = {}  # raw field -> its id array, None for fields without '='
+
+    def __len__(self):
+        return len(self._postings)
+
+    def extend(self, first_id, lines):
+        # lines are the raw candidate lines, first_id is the id of the first one
+        fields = self._fields
+        for candidate_id, line in enumerate(lines, first_id):
+            if b'\t' not in line or b'=' not in line:
+                continue
+            # a site or department repeats on many lines, each raw field is parsed once
+            for field in line.split(b'\t')[1:]:
+                ids = fields.get(field, False)
+                if ids is False:
+                    ids = fields[field] = self._ids_of(field)
+                if ids is not None and (not ids or ids[-1] != candidate_id):
+                    ids.append(candidate_id)
+
+    def _ids_of(self, field):
+        key, sep, value = field.decode('utf-8', 'replace').partition('=')
+        key = normalize(key)
+        if not sep or not key:
+            return None
+        values = self._postings.setdefault(key, {})
+        value = normalize(value)
+        ids = values.get(value)
+        if ids is None:
+            ids = values[value] = array('I')
+        return ids
+
+    def keys(self):
+        return sorted(self._postings)
+
+    def values(self, key):
+        # value -> number of candidates
+        return {value: len(ids) for value, ids in self._postings.get(normalize(key), {}).items()}
+
+    def select(self, terms):
+        # ascending ids of the candidates matching parsed terms, shortest id lists first
+        lists = []
+        for key, wanted in terms.items():
+            values = self._postings.get(key)
+            if values is None:
+                raise ValueError('no candidate has the attribute', key)
+            matched = [values[value] for value in wanted if value in values]
+            if len(matched) == 1:
+                lists.append(matched[0])
+            else:
+                lists.append(array('I', sorted(set().union(*matched))))
+
+        lists.sort(key=len)
+        selected = lists[0] if lists else array('I')
+        for ids in lists[1:]:
+            if not selected:
+                break
+            selected = array('I', intersect(selected, ids))
+        return selected
+
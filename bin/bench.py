@@ -0,0 +1,181 @@
+# -*- coding: utf-8 -*-
+
+# Headless benchmarks for the load, draw, mask and settings paths
+#
+# Runs RollingApp without a window and prints the results as JSON. With
+# --baseline the results are compared with an earlier run and the exit
+# status is 1 when a metric got worse by more than --tolerance.
+#
+#   python bench.py --sizes 10000 1000000 --output bench.json
+#   python bench.py --baseline bench.json
+
+
+import os
+import sys
+import json
+import time
+import random
+import argparse
+import platform
+import tempfile
+
+from masking import mask_name
+
+
+DEFAULT_SIZES = (10 ** 4, 10 ** 5, 10 ** 6)
+DRAW_COUNT = 100000
+STOP_COUNT = 1000
+MASK_COUNT = 200000
+SETTINGS_COUNT = 200
+
+
+def percentile(values, p):
+    values = sorted(values)
+    return values[min(len(values) - 1, int(len(values) * p))]
+
+
+def metric(value, unit, better):
+    return {'value': value, 'unit': unit, 'better': better}
+
+
+def write_list_file(path, size):
+    rng = random.Random(size)
+    with open(path, 'w', encoding='utf-8') as out:
+        for i in range(size):
+            out.write('%08d %s\n' % (i, ''.join(rng.choice('abcdefghijklmnopqrstuvwxyz') for _ in range(8))))
+
+
+def bench_load(app, path, size):
+    start = time.perf_counter()
+    app.read_candidates_list(path)
+    elapsed = time.perf_counter() - start
+    return {'load_%d' % size: metric(elapsed, 's', 'lower'),
+            'load_rate_%d' % size: metric(size / elapsed, 'lines/s', 'higher')}
+
+
+def bench_draw(app, size):
+    results = {}
+
+    start = time.perf_counter()
+    for _ in range(DRAW_COUNT):
+        app.get_rand_index()
+    results['draws_per_sec_%d' % size] = metric(DRAW_COUNT / (time.perf_counter() - start), 'draws/s', 'higher')
+
+    stops = []
+    for _ in range(min(STOP_COUNT, size)):
+        start = time.perf_counter()
+        app.remove_winner_candidate()
+        stops.append(time.perf_counter() - start)
+    results['stop_p50_%d' % size] = metric(percentile(stops, 0.5), 's', 'lower')
+    results['stop_p99_%d' % size] = metric(percentile(stops, 0.99), 's', 'lower')
+
+    start = time.perf_counter()
+    app.on_reset_button()
+    results['reset_%d' % size] = metric(time.perf_counter() - start, 's', 'lower')
+    return results
+
+
+def bench_mask(app):
+    ids = [app.pool.candidate_id(i) for i in range(min(1000, len(app.pool)))]
+    names = [app.pool.candidates[i] for i in ids]
+    app.masks.set_visible(3, 4)
+
+    start = time.perf_counter()
+    for i in range(MASK_COUNT):
+        app._lucky_id = ids[i % len(ids)]
+        app.get_masked()
+    cached = MASK_COUNT / (time.perf_counter() - start)
+
+    start = time.perf_counter()
+    for i in range(MASK_COUNT):
+        mask_name(names[i % len(names)], 3, 4)
+    uncached = MASK_COUNT / (time.perf_counter() - start)
+
+    return {'masked_per_sec': metric(cached, 'names/s', 'higher'),
+            'mask_name_per_sec': metric(uncached, 'names/s', 'higher')}
+
+
+def bench_settings(app, directory, config_file):
+    path = os.path.join(directory, 'settings.cfg')
+
+    start = time.perf_counter()
+    for _ in range(SETTINGS_COUNT):
+        settings = app.load_config_file(config_file)
+    load = (time.perf_counter() - start) / SETTINGS_COUNT
+
+    start = time.perf_counter()
+    for _ in range(SETTINGS_COUNT):
+        app.write_config_file(path, settings)
+    save = (time.perf_counter() - start) / SETTINGS_COUNT
+
+    return {'settings_load': metric(load, 's', 'lower'),
+            'settings_save': metric(save, 's', 'lower')}
+
+
+def compare(results, baseline, tolerance):
+    regressions = []
+    for name, current in sorted(results.items()):
+        previous = baseline.get(name)
+        if previous is None or not previous['value']:
+            continue
+
+        ratio = current['value'] / previous['value']
+        if current['better'] == 'higher':
+            worse = ratio < 1 - tolerance
+        else:
+            worse = ratio > 1 + tolerance
+        if worse:
+            regressions.append({'metric': name, 'baseline': previous['value'], 'current': current['value'],
+                                'ratio': ratio})
+    return regressions
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description='Headless Lucky Draw benchmarks')
+    parser.add_argument('--sizes', type=int, nargs='+', default=DEFAULT_SIZES, help='candidate list sizes')
+    parser.add_argument('--label', default='', help='free text stored with the results, e.g. a version')
+    parser.add_argument('--output', help='write the JSON results to this file')
+    parser.add_argument('--baseline', help='JSON results of an earlier run to compare with')
+    parser.add_argument('--tolerance', type=float, default=0.2, help='allowed relative slowdown')
+    args = parser.parse_args(argv)
+    output = args.output and os.path.abspath(args.output)
+    baseline_file = args.baseline and os.path.abspath(args.baseline)
+
+    # GoLucky changes into its own directory on import
+    from GoLucky import RollingApp, DEFAULT_SETTING_FILE
+
+    random.seed(0)
+    app = RollingApp(headless=True)
+    results = {}
+
+    with tempfile.TemporaryDirectory() as directory:
+        for size in args.sizes:
+            path = os.path.join(directory, 'list_%d.txt' % size)
+            write_list_file(path, size)
+            results.update(bench_load(app, path, size))
+            results.update(bench_draw(app, size))
+            print('done', size, file=sys.stderr)
+
+        results.update(bench_mask(app))
+        results.update(bench_settings(app, directory, DEFAULT_SETTING_FILE))
+
+        app.pool.candidates.close()
+
+    report = {'label': args.label, 'python': platform.python_version(), 'platform': platform.platform(),
+              'time': time.time(), 'results': results}
+
+    if baseline_file:
+        with open(baseline_file, 'rt', encoding='utf-8') as baseline:
+            report['regressions'] = compare(results, json.load(baseline)['results'], args.tolerance)
+
+    text = json.dumps(report, indent='\t')
+    if output:
+        with open(output, 'wt', encoding='utf-8') as out:
+            out.write(text)
+    print(text)
+
+    return 1 if report.get('regressions') else 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())
@@ -0,0 +1,214 @@
+# -*- coding: utf-8 -*-
+
+# Candidate list with a flat line index
+#
+# The list file is read once into a private buffer and indexed in a single
+# scan: only the start offset and length of every non-blank line are kept. A
+# candidate's text is decoded when it is asked for, so startup cost is the
+# read and the indexing scan only. The file itself is not kept mapped or
+# open: an editor truncating or rewriting it in place would make the next
+# read of a shared mapping fault (SIGBUS), and on Windows an open mapping
+# keeps the file from being saved.
+#
+# A list may carry a ticket count after the name, separated by a tab:
+#     Alice<TAB>3
+# The column is detected on the first candidate line only: when that line
+# has no count, counts on later lines are read as part of the name. Missing
+# or invalid counts are read as one ticket, a count of 0 or below keeps the
+# candidate in the list but out of the draw.
+#
+# Attributes for eligibility filters may follow as key=value fields:
+#     Alice<TAB>3<TAB>site=Berlin
+# An optional merkle.MerkleTree and attributes.AttributeIndex are fed the
+# lines as they are indexed, so neither costs a second pass over the file.
+#
+# The scan also keeps a digest of the bytes indexed so far. When the file
+# grows, file_starts_with() tells whether it was only appended to, and
+# extend() then reads and indexes the new tail alone.
+
+
+import os
+from hashlib import blake2b
+from array import array
+from itertools import accumulate, compress, repeat
+from operator import add
+
+
+BOM = b'\xef\xbb\xbf'
+SCAN_CHUNK = 1 << 22  # bytes
+CONTENT_DIGEST_SIZE = 32
+
+
+def file_starts_with(path, size, digest):
+    # True when the first size bytes of the file still have the given content digest
+    content = blake2b(digest_size=CONTENT_DIGEST_SIZE)
+    try:
+        with open(path, 'rb') as source:
+            while size > 0:
+                block = source.read(min(SCAN_CHUNK, size))
+                if not block:
+                    return False
+                content.update(block)
+                size -= len(block)
+    except OSError:
+        return False
+    return content.digest() == digest
+
+
+def clean_line(text):
+    line = text.strip(' \n\r')
+    return line.strip('\ufeff')  # BOM
+
+
+def parse_weight(line):
+    fields = line.split(b'\t', 2)
+    try:
+        weight = int(fields[1])
+    except (IndexError, ValueError):
+        return 1
+    return max(weight, 0)
+
+
+def has_weight_column(text):
+    fields = text.split('\t')
+    return len(fields) > 1 and fields[1].strip().isdigit()
+
+
+class MappedCandidateList(object):
+    def __init__(self, path, merkle=None, attributes=None):
+        self.path = path
+        self.merkle = merkle
+        self.attributes = attributes
+        self._data = bytearray()
+        self._size = 0
+        self._starts = array('Q')
+        self._lengths = array('I')
+        self._content = blake2b(digest_size=CONTENT_DIGEST_SIZE)
+        self.weights = None
+
+        self._size = self._read_from(0)
+        self._detect_columns()
+        if merkle is not None:
+            merkle.candidates = self
+        self._scan(0, self._size)
+
+    def _read_from(self, pos):
+        # copies the file from pos on behind the first pos bytes of the buffer,
+        # returns the new size or -1 when the file is shorter than pos
+        with open(self.path, 'rb') as source:
+            if os.fstat(source.fileno()).st_size < pos:
+                return -1
+            source.seek(pos)
+            tail = source.read()
+        del self._data[pos:]
+        self._data += tail
+        return len(self._data)
+
+    def _detect_columns(self):
+        if not self._size:
+            return
+
+        pos = 0
+        while pos < self._size:
+            end = self._data.find(b'\n', pos)
+            end = self._size if end < 0 else end
+            text = clean_line(self._data[pos:end].decode('utf-8', 'replace'))
+            if text:
+                if has_weight_column(text):
+                    self.weights = array('q')
+                return
+            pos = end + 1
+
+    def _scan(self, pos, size):
+        data = self._data
+        starts = self._starts
+        lengths = self._lengths
+        weights = self.weights
+        strip_chars = repeat(b' \r')
+
+        while pos < size:
+            end = data.find(b'\n', min(pos + SCAN_CHUNK, size) - 1, size)
+            end = size if end < 0 else end + 1
+
+            chunk = bytes(data[pos:end])
+            self._content.update(chunk)
+            lines = chunk.split(b'\n')
+            line_lengths = list(map(len, lines))
+            line_starts = accumulate(map(add, line_lengths, repeat(1)), initial=pos)
+            not_blank = list(map(bytes.strip, lines, strip_chars))
+            if BOM in chunk:
+                not_blank = self._drop_bom_only_lines(not_blank)
+
+            first_id = len(starts)
+            starts.extend(compress(line_starts, not_blank))
+            lengths.extend(compress(line_lengths, not_blank))
+            if weights is not None:
+                weights.extend(map(parse_weight, compress(lines, not_blank)))
+            if self.merkle is not None:
+                self.merkle.extend(filter(None, not_blank))
+            if self.attributes is not None and b'=' in chunk:
+                self.attributes.extend(first_id, compress(lines, not_blank))
+            pos = end
+
+    def extend(self):
+        # indexes the lines appended since the last scan and returns their
+        # count, or None when the file no longer continues the indexed bytes
+        # after a line break; the caller checked the old bytes with
+        # file_starts_with() and reads the whole list again on None
+        old_size = self._size
+        count = len(self)
+        size = self._read_from(old_size)
+        if size < 0:
+            return None
+        self._size = size
+        if old_size and self._data[old_size - 1] != 0x0a and self._data[old_size:old_size + 1] not in (b'\n', b'\r'):
+            # the last line had no line break and was written on
+            return None
+        if not count:
+            self._detect_columns()
+        self._scan(old_size, self._size)
+        return len(self) - count
+
+    @property
+    def scanned_size(self):
+        return self._size
+
+    def content_digest(self):
+        # digest of the bytes indexed so far, see file_starts_with()
+        return self._content.digest()
+
+    def _drop_bom_only_lines(self, stripped):
+        # a line holding nothing but BOMs and spaces is blank once cleaned
+        kept = []
+        for line in stripped:
+            if line and BOM in line:
+                text = clean_line(line.decode('utf-8', 'replace'))
+                if self.weights is not None:
+                    text = text.split('\t', 1)[0]
+                if not text:
+                    line = b''
+            kept.append(line)
+        return kept
+
+    def __len__(self):
+        return len(self._starts)
+
+    @property
+    def data(self):
+        return self._data
+
+    def raw(self, index):
+        # the line as committed, without the line break and surrounding spaces
+        start = self._starts[index]
+        return bytes(self._data[start:start + self._lengths[index]]).strip(b' \r')
+
+    def __getitem__(self, index):
+        start = self._starts[index]
+        raw = self._data[start:start + self._lengths[index]]
+        text = clean_line(raw.decode('utf-8', 'replace'))
+        if self.weights is not None or (self.attributes and '\t' in text):
+            return text.split('\t', 1)[0]
+        return text
+
+    def close(self):
+        self._data = None
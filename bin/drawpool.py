@@ -0,0 +1,237 @@
+# -*- coding: utf-8 -*-
+
+# Draw-without-replacement pool
+#
+# The candidates are never moved. The pool keeps one array of candidate ids
+# and a live boundary: ids in order[0:live] can still win, ids behind the
+# boundary are winners. Removing a winner swaps it with the last live id and
+# moves the boundary down, resetting moves the boundary back to the end.
+#
+# With ticket weights the winner is sampled from a Fenwick tree instead, and
+# its weight is zeroed on removal, so a draw costs O(log n).
+#
+# An EligiblePool draws from the live candidates among a given set of ids,
+# e.g. those matching a prize's attribute filter. It keeps its own Fenwick
+# tree over that set only, so building it costs the size of the set and a
+# draw O(log n) of it. A winner only depends on which eligible candidates
+# are live, so a journal replay may build the set again at any time.
+#
+# The order and its inverse are flat arrays of 4 byte ids, together with the
+# candidate list that is about 8 bytes of memory per candidate plus the
+# offsets and the list text, instead of two Python lists of int objects.
+
+
+import sys
+import random
+import argparse
+from array import array
+from candidatelist import MappedCandidateList
+from attributes import AttributeIndex, parse_filter
+from fenwick import FenwickTree
+from philox import PhiloxRandom
+
+
+MAX_BATCH_SIZE = 1000  # winners drawn at one STOP
+
+
+class DrawPool(object):
+    def __init__(self, candidates=(), weights=None, rng=None):
+        self.rng = rng or random
+        self.load(candidates, weights)
+
+    def load(self, candidates, weights=None):
+        self.candidates = candidates
+        size = len(candidates)
+        self._order = array('I' if size <= 0xffffffff else 'Q', range(size))
+        self._pos = self._order[:]
+        self._live = size
+        self._tree = FenwickTree(weights) if weights is not None else None
+
+    @property
+    def weighted(self):
+        return self._tree is not None
+
+    def __len__(self):
+        return self._live
+
+    @property
+    def max_index(self):
+        return self._live - 1
+
+    @property
+    def total(self):
+        return len(self._order)
+
+    def rand_index(self):
+        if self._tree is not None:
+            return self._pos[self._tree.sample(self.rng)]
+        return self.rng.randint(0, self._live - 1)
+
+    def can_draw(self):
+        if self._tree is not None:
+            return self._tree.total > 0
+        return self._live > 0
+
+    def candidate_id(self, index):
+        return self._order[index]
+
+    def get(self, index):
+        return self.candidates[self._order[index]]
+
+    def remove(self, index):
+        if not 0 <= index < self._live:
+            raise IndexError('pool index out of range', index)
+
+        last = self._live - 1
+        order = self._order
+        winner = order[index]
+        moved = order[last]
+        order[index] = moved
+        order[last] = winner
+        self._pos[moved] = index
+        self._pos[winner] = last
+        self._live = last
+
+        if self._tree is not None:
+            self._tree.remove(winner)
+        return winner
+
+    def extend(self, size, weights=None):
+        # candidates appended to the list join the live region, winners stay behind the boundary
+        old = len(self._order)
+        if size <= old:
+            return
+        live = self._live
+        order = self._order
+        order[live:live] = array(order.typecode, range(old, size))
+        self._pos.extend(range(old, size))
+        pos = self._pos
+        for index in range(live, size):
+            pos[order[index]] = index
+        self._live = live + size - old
+
+        if self._tree is not None:
+            self._tree.extend(weights[old:size])
+
+    def remove_id(self, candidate_id):
+        return self.remove(self._pos[candidate_id])
+
+    def is_live(self, candidate_id):
+        return self._pos[candidate_id] < self._live
+
+    def weight(self, candidate_id):
+        # tickets a candidate has in the next draw, 0 for winners
+        if self._tree is not None:
+            return self._tree.weight(candidate_id)
+        return 1 if self.is_live(candidate_id) else 0
+
+    def eligible(self, candidate_ids):
+        return EligiblePool(self, candidate_ids)
+
+    def get_state(self):
+        return self._order, self._live
+
+    def set_state(self, order, live):
+        # a shorter order was saved before candidates were appended, the pool
+        # shrinks to it and extend() appends them again where they were
+        size = len(order)
+        if size > len(self._order) or not 0 <= live <= size:
+            raise ValueError('pool state does not match the candidates')
+
+        if size < len(self._order):
+            self._pos = self._pos[:size]
+            if self._tree is not None:
+                self._tree = self._tree.head(size)
+        self._order = array(self._order.typecode, order)
+        pos = self._pos
+        for index, candidate_id in enumerate(self._order):
+            pos[candidate_id] = index
+        self._live = live
+
+        if self._tree is not None:
+            self._tree.reset()
+            for candidate_id in self._order[live:]:
+                self._tree.remove(candidate_id)
+
+    def draw(self):
+        return self.remove(self.rand_index())
+
+    def draw_many(self, count):
+        # partial Fisher-Yates over the live region, O(count); O(count log n) with ticket weights
+        winners = []
+        while len(winners) < count and self.can_draw():
+            winners.append(self.draw())
+        return winners
+
+    def reset(self):
+        self._live = len(self._order)
+        if self._tree is not None:
+            self._tree.reset()
+
+    def winners(self):
+        # most recent winner first
+        return self._order[self._live:]
+
+
+class EligiblePool(object):
+    def __init__(self, pool, candidate_ids):
+        # candidate_ids ascending, e.g. from AttributeIndex.select()
+        self.pool = pool
+        self.ids = candidate_ids
+        weights = list(map(pool.weight, candidate_ids))
+        self._count = len(weights) - weights.count(0)
+        self._tree = FenwickTree(weights)
+
+    def __len__(self):
+        # live eligible candidates
+        return self._count
+
+    @property
+    def total(self):
+        return self._tree.total
+
+    def can_draw(self):
+        return self._tree.total > 0
+
+    def candidate_id(self, value):
+        # the live candidate covering value, 0 <= value < total; for the rolling display
+        return self.ids[self._tree.find(value)]
+
+    def draw(self):
+        index = self._tree.sample(self.pool.rng)
+        winner = self.ids[index]
+        self._tree.remove(index)
+        self._count -= 1
+        self.pool.remove_id(winner)
+        return winner
+
+    def draw_many(self, count):
+        winners = []
+        while len(winners) < count and self.can_draw():
+            winners.append(self.draw())
+        return winners
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description='Draw winners without opening the stage window')
+    parser.add_argument('list', help='candidate list file, one candidate per line')
+    parser.add_argument('-k', '--count', type=int, default=1, help='number of winners to draw')
+    parser.add_argument('--seed', type=int, default=None, help='seed the random generator')
+    parser.add_argument('--stream', type=int, default=0, help='generator stream, for parallel pre-draws')
+    parser.add_argument('--filter', help="draw only eligible candidates, e.g. 'site=Berlin,Munich; dept=Sales'")
+    args = parser.parse_args(argv)
+
+    rng = PhiloxRandom(args.seed, args.stream)
+    print('seed', rng.seed_value, 'stream', rng.stream, file=sys.stderr)
+
+    candidates = MappedCandidateList(args.list, attributes=AttributeIndex())
+    pool = DrawPool(candidates, candidates.weights, rng)
+    if args.filter:
+        pool = pool.eligible(candidates.attributes.select(parse_filter(args.filter)))
+    for candidate_id in pool.draw_many(args.count):
+        print(candidate_id, candidates[candidate_id], sep='\t')
+    candidates.close()
+
+
+if __name__ == '__main__':
+    sys.exit(main())
@@ -0,0 +1,307 @@
+# -*- coding: utf-8 -*-
+
+# Fairness simulation
+#
+# Runs many draw rounds, counts how often every candidate wins at every draw
+# position of a round and tests the counts against the expected
+# distribution. A round draws --draws winners and then resets the pool, the
+# same as pressing STOP --draws times and then Reset.
+#
+# The exact mode runs the real DrawPool with the app's PhiloxRandom, one
+# stream per task. The vectorized mode (NumPy, unweighted lists) is for the
+# 10^8 and more rounds: it runs DrawPool's swap-remove on many pools at once,
+# one row per pool, and every row draws from its own PhiloxRandom stream,
+# computed in NumPy and mapped to an index the way randrange() maps it.
+# Before simulating it checks that a few rows pick exactly the winners the
+# real DrawPool picks on the same streams. Tasks are spread over all CPU
+# cores.
+#
+# Every position is uniform for an unweighted list. With ticket counts only
+# the first draw of a round has a simple expected distribution (w / W), so
+# only that position is tested.
+#
+#   python fairness.py --candidates 100 --draws 3 --rounds 10000000
+#   python fairness.py --list ../LIST.txt --draws 1 --rounds 1000000 --mode exact
+
+
+import os
+import sys
+import json
+import math
+import time
+import argparse
+import importlib.util
+from array import array
+from concurrent.futures import ProcessPoolExecutor
+
+from drawpool import DrawPool
+from philox import PhiloxRandom, seed_to_key, M32, PHILOX_M0, PHILOX_M1, PHILOX_W0, PHILOX_W1, PHILOX_ROUNDS
+from candidatelist import MappedCandidateList
+
+
+TASKS_PER_JOB = 4
+LANE_CELLS = 1 << 22  # pool slots per vectorized batch, bounds memory
+SIGNIFICANCE = 0.001
+LANE_STREAM_SHIFT = 32  # row j of task stream s draws from stream (s << 32) | j
+CHECK_LANES = 4
+CHECK_ROUNDS = 50
+
+
+def simulate_exact(size, weights, draws, rounds, seed, stream):
+    # counts[position][candidate] from the real DrawPool
+    pool = DrawPool(range(size), weights, PhiloxRandom(seed, stream))
+    counts = [array('Q', bytes(8 * size)) for _ in range(draws)]
+    remove = pool.remove
+    rand_index = pool.rand_index
+    for _ in range(rounds):
+        for position in range(draws):
+            counts[position][remove(rand_index())] += 1
+        pool.reset()
+    return counts
+
+
+def lane_stream(stream, lane):
+    return (stream << LANE_STREAM_SHIFT) | lane
+
+
+def philox_words(numpy, positions, streams, key):
+    # output word `position` of every stream, philox4x32 on uint64 arrays of 32 bit values
+    u = numpy.uint64
+    m32 = u(M32)
+    shift = u(32)
+    block = positions >> u(2)
+    c0, c1, c2, c3 = block & m32, block >> shift, streams & m32, streams >> shift
+    k0, k1 = (u(part) for part in key)
+    for _ in range(PHILOX_ROUNDS):
+        p0 = u(PHILOX_M0) * c0
+        p1 = u(PHILOX_M1) * c2
+        c0, c1, c2, c3 = (p1 >> shift) ^ c1 ^ k0, p1 & m32, (p0 >> shift) ^ c3 ^ k1, p0 & m32
+        k0 = (k0 + u(PHILOX_W0)) & m32
+        k1 = (k1 + u(PHILOX_W1)) & m32
+    words = numpy.stack((c0, c1, c2, c3))
+    return words[(positions & u(3)).astype(numpy.intp), numpy.arange(len(positions))]
+
+
+def random_below(numpy, n, positions, streams, key):
+    # randrange(n) on every stream: getrandbits(k) with rejection, as random.Random._randbelow
+    u = numpy.uint64
+    mask = u((1 << n.bit_length()) - 1)
+    result = numpy.empty(len(positions), dtype=numpy.int64)
+    pending = numpy.arange(len(positions))
+    while len(pending):
+        values = philox_words(numpy, positions[pending], streams[pending], key) & mask
+        positions[pending] += u(1)
+        accepted = values < u(n)
+        result[pending[accepted]] = values[accepted]
+        pending = pending[~accepted]
+    return result
+
+
+def vectorized_rounds(size, draws, rounds, seed, stream, lanes=None):
+    # yields the winners of every batch of rounds, shape (draws, rows); row j
+    # is a DrawPool drawing from PhiloxRandom(seed, lane_stream(stream, j))
+    import numpy
+
+    if size > M32:
+        raise ValueError('the vectorized mode takes at most 2**32 - 1 candidates')
+    lanes = lanes or max(1, min(rounds, LANE_CELLS // size))
+    key = seed_to_key(seed)
+    streams = numpy.array([lane_stream(stream, lane) for lane in range(lanes)], dtype=numpy.uint64)
+    positions = numpy.zeros(lanes, dtype=numpy.uint64)
+    order = numpy.tile(numpy.arange(size, dtype=numpy.int64), (lanes, 1))
+
+    done = 0
+    while done < rounds:
+        active = min(lanes, rounds - done)
+        lane_rows = numpy.arange(active)
+        winners = numpy.empty((draws, active), dtype=numpy.int64)
+        for position in range(draws):
+            live = size - position
+            index = random_below(numpy, live, positions[:active], streams[:active], key)
+            winners[position] = order[lane_rows, index]
+            order[lane_rows, index] = order[lane_rows, live - 1]
+            order[lane_rows, live - 1] = winners[position]
+        # reset only moves the live boundary back, the order stays as it is
+        yield winners
+        done += active
+
+
+def simulate_vectorized(size, draws, rounds, seed, stream):
+    import numpy
+
+    totals = numpy.zeros((draws, size), dtype=numpy.uint64)
+    for winners in vectorized_rounds(size, draws, rounds, seed, stream):
+        for position in range(draws):
+            totals[position] += numpy.bincount(winners[position], minlength=size).astype(numpy.uint64)
+    return [array('Q', totals[position].tobytes()) for position in range(draws)]
+
+
+def check_vectorized(size, draws, seed, lanes=CHECK_LANES, rounds=CHECK_ROUNDS):
+    # the vectorized rows must pick the winners the real DrawPool picks on the same streams
+    pools = [DrawPool(range(size), None, PhiloxRandom(seed, lane_stream(0, lane))) for lane in range(lanes)]
+    for winners in vectorized_rounds(size, draws, lanes * rounds, seed, 0, lanes):
+        for lane, pool in enumerate(pools):
+            expected = pool.draw_many(draws)
+            pool.reset()
+            if expected != winners[:, lane].tolist():
+                return False
+    return True
+
+
+def run_task(task):
+    mode, size, weights, draws, rounds, seed, stream = task
+    if mode == 'vectorized':
+        return simulate_vectorized(size, draws, rounds, seed, stream)
+    return simulate_exact(size, weights, draws, rounds, seed, stream)
+
+
+def chi_squared(counts, expected):
+    # statistic, degrees of freedom and p-value (Wilson-Hilferty approximation)
+    statistic = 0.0
+    cells = 0
+    for observed, wanted in zip(counts, expected):
+        if wanted > 0:
+            statistic += (observed - wanted) ** 2 / wanted
+            cells += 1
+    df = max(1, cells - 1)
+    z = ((statistic / df) ** (1.0 / 3) - (1 - 2.0 / (9 * df))) / math.sqrt(2.0 / (9 * df))
+    return statistic, df, 0.5 * math.erfc(z / math.sqrt(2))
+
+
+def kolmogorov_smirnov(counts, probabilities):
+    # largest CDF distance over the candidate order and its asymptotic p-value
+    total = sum(counts)
+    observed = expected = distance = 0.0
+    for count, probability in zip(counts, probabilities):
+        observed += count / total
+        expected += probability
+        distance = max(distance, abs(observed - expected))
+
+    root = math.sqrt(total)
+    x = (root + 0.12 + 0.11 / root) * distance
+    if x < 0.2:
+        return distance, 1.0
+    p = 2 * sum((-1) ** (j - 1) * math.exp(-2 * j * j * x * x) for j in range(1, 101))
+    return distance, min(1.0, max(0.0, p))
+
+
+def analyse(counts, weights, rounds):
+    size = len(counts[0])
+    if weights is None:
+        probabilities = [1.0 / size] * size
+        tested = range(len(counts))
+    else:
+        total_weight = sum(weights)
+        probabilities = [weight / total_weight for weight in weights]
+        tested = range(1)
+
+    positions = []
+    for position in tested:
+        expected = [rounds * probability for probability in probabilities]
+        statistic, df, chi_p = chi_squared(counts[position], expected)
+        distance, ks_p = kolmogorov_smirnov(counts[position], probabilities)
+        ratios = [count / wanted for count, wanted in zip(counts[position], expected) if wanted]
+        positions.append({'position': position + 1, 'chi2': statistic, 'df': df, 'chi2_p': chi_p,
+                          'ks_d': distance, 'ks_p': ks_p, 'min_ratio': min(ratios), 'max_ratio': max(ratios)})
+    return positions
+
+
+def simulate(size, weights, draws, rounds, seed, mode, jobs):
+    jobs = jobs or os.cpu_count() or 1
+    task_count = max(1, min(rounds, jobs * TASKS_PER_JOB))
+    share, extra = divmod(rounds, task_count)
+    # one generator stream per task, the results do not depend on the number of jobs
+    tasks = [(mode, size, weights, draws, share + (stream < extra), seed, stream) for stream in range(task_count)]
+
+    counts = [array('Q', bytes(8 * size)) for _ in range(draws)]
+    if jobs == 1:
+        results = map(run_task, tasks)
+        executor = None
+    else:
+        executor = ProcessPoolExecutor(jobs)
+        results = executor.map(run_task, tasks)
+    try:
+        for result in results:
+            for total, part in zip(counts, result):
+                for candidate, count in enumerate(part):
+                    total[candidate] += count
+    finally:
+        if executor is not None:
+            executor.shutdown()
+    return counts
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description='Simulate many draws and test that every candidate is equally likely')
+    parser.add_argument('--list', help='candidate list file, ticket counts are used when present')
+    parser.add_argument('--candidates', type=int, default=100, help='size of a synthetic list when --list is not given')
+    parser.add_argument('--draws', type=int, default=1, help='winners drawn per round before the reset')
+    parser.add_argument('--rounds', type=int, default=1000000)
+    parser.add_argument('--seed', type=int, default=None)
+    parser.add_argument('--mode', choices=('auto', 'exact', 'vectorized'), default='auto',
+                        help='auto uses vectorized when NumPy is installed and the list has no ticket counts, '
+                             'it is checked against the exact mode first')
+    parser.add_argument('--jobs', type=int, help='worker processes (default: one per CPU)')
+    parser.add_argument('--output', help='write the statistics and the win counts as JSON')
+    args = parser.parse_args(argv)
+
+    weights = None
+    size = args.candidates
+    if args.list:
+        candidates = MappedCandidateList(args.list)
+        size = len(candidates)
+        weights = list(candidates.weights) if candidates.weights is not None else None
+        candidates.close()
+    if not 1 <= args.draws <= size:
+        parser.error('--draws must be between 1 and the number of candidates')
+
+    mode = args.mode
+    if mode != 'exact':
+        if importlib.util.find_spec('numpy') is None:
+            if mode == 'vectorized':
+                parser.error('the vectorized mode needs NumPy')
+            mode = 'exact'
+        else:
+            if weights is not None and mode == 'vectorized':
+                parser.error('the vectorized mode does not support ticket counts')
+            mode = 'exact' if weights is not None else 'vectorized'
+
+    seed = args.seed if args.seed is not None else PhiloxRandom().seed_value
+    if mode == 'vectorized':
+        print('vectorized mode: NumPy rows run the swap-remove of DrawPool on PhiloxRandom streams, '
+              'with the randrange() mapping')
+        if not check_vectorized(size, args.draws, seed):
+            print('the vectorized rows did not draw the winners DrawPool draws, not simulating')
+            return 2
+        print('checked: %d rows x %d rounds drew the same winners as DrawPool with PhiloxRandom'
+              % (CHECK_LANES, CHECK_ROUNDS))
+    else:
+        print('exact mode: DrawPool with PhiloxRandom, one stream per task')
+    start = time.perf_counter()
+    counts = simulate(size, weights, args.draws, args.rounds, seed, mode, args.jobs)
+    elapsed = time.perf_counter() - start
+
+    positions = analyse(counts, weights, args.rounds)
+    report = {'mode': mode, 'seed': seed, 'candidates': size, 'draws': args.draws, 'rounds': args.rounds,
+              'weighted': weights is not None, 'seconds': elapsed,
+              'draws_per_sec': args.rounds * args.draws / elapsed, 'positions': positions}
+
+    print('%s mode, seed %d: %d rounds of %d draws from %d candidates in %.1f s (%.0f draws/s)'
+          % (mode, seed, args.rounds, args.draws, size, elapsed, report['draws_per_sec']))
+    failed = False
+    for result in positions:
+        suspicious = result['chi2_p'] < SIGNIFICANCE or result['ks_p'] < SIGNIFICANCE
+        failed = failed or suspicious
+        print('draw %d: chi2 %.1f (df %d, p %.4f)  KS D %.2e (p %.4f)  win ratio %.3f..%.3f%s'
+              % (result['position'], result['chi2'], result['df'], result['chi2_p'], result['ks_d'], result['ks_p'],
+                 result['min_ratio'], result['max_ratio'], '  SUSPICIOUS' if suspicious else ''))
+
+    if args.output:
+        report['counts'] = [list(position) for position in counts]
+        with open(args.output, 'wt', encoding='utf-8') as out:
+            json.dump(report, out)
+    return 1 if failed else 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())
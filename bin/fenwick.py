@@ -0,0 +1,97 @@
+# -*- coding: utf-8 -*-
+
+# Fenwick (binary indexed) tree over integer ticket counts
+#
+# Supports sampling an item with probability proportional to its weight and
+# changing a weight, both in O(log n). Weights are integers so removing and
+# restoring winners never accumulates rounding error.
+
+
+from array import array
+
+
+class FenwickTree(object):
+    def __init__(self, weights):
+        self.size = len(weights)
+        tree = array('q', [0])
+        tree.extend(weights)
+        for i in range(1, self.size + 1):
+            parent = i + (i & -i)
+            if parent <= self.size:
+                tree[parent] += tree[i]
+
+        self._initial = tree
+        self._initial_weights = array('q', weights)
+        self._weights = array('q', weights)
+        self._tree = array('q', tree)
+        self._top = 1 << self.size.bit_length() if self.size else 0
+
+    @property
+    def total(self):
+        return self.prefix_sum(self.size)
+
+    def weight(self, index):
+        return self._weights[index]
+
+    def prefix_sum(self, count):
+        # sum of the first count weights
+        total = 0
+        tree = self._tree
+        while count > 0:
+            total += tree[count]
+            count &= count - 1
+        return total
+
+    def add(self, index, delta):
+        self._weights[index] += delta
+        i = index + 1
+        tree = self._tree
+        while i <= self.size:
+            tree[i] += delta
+            i += i & -i
+
+    def remove(self, index):
+        weight = self._weights[index]
+        if weight:
+            self.add(index, -weight)
+        return weight
+
+    def find(self, value):
+        # index of the item covering value, 0 <= value < total
+        pos = 0
+        step = self._top
+        tree = self._tree
+        while step:
+            nxt = pos + step
+            if nxt <= self.size and tree[nxt] <= value:
+                pos = nxt
+                value -= tree[nxt]
+            step >>= 1
+        return pos
+
+    def sample(self, rng):
+        return self.find(rng.randrange(self.total))
+
+    def extend(self, weights):
+        # appends items, each new node sums its weight and the nodes below it
+        for weight in weights:
+            self._weights.append(weight)
+            self._initial_weights.append(weight)
+            self.size += 1
+            for tree in (self._tree, self._initial):
+                node = weight
+                child = self.size - 1
+                low = self.size - (self.size & -self.size)
+                while child > low:
+                    node += tree[child]
+                    child &= child - 1
+                tree.append(node)
+        self._top = 1 << self.size.bit_length() if self.size else 0
+
+    def head(self, size):
+        # a tree of the first size items with their initial weights, as before extend() appended the rest
+        return FenwickTree(self._initial_weights[:size])
+
+    def reset(self):
+        self._tree = array('q', self._initial)
+        self._weights = array('q', self._initial_weights)
@@ -1,23 +1,37 @@
 ## code based on http://tkinter.unpythonic.net/wiki/FontChooser
 
 
-from tkinter.tix import *
 from tkinter import *
 import tkinter.simpledialog
 import tkinter.font
 
 
+FONT_SIZES = range(6, 200)
+FILL_CHUNK = 200  # families inserted per idle callback
+PREVIEW_DELAY = 100  # ms
+
+_fontFamilies = None
+
+
+def getFontFamilies(root):
+    # font.families() is slow with many fonts installed, ask Tk once per process
+    global _fontFamilies
+    if _fontFamilies is None:
+        _fontFamilies = sorted(f for f in tkinter.font.families(root) if not f.startswith('@'))
+    return _fontFamilies
+
+
 class FontChooser(tkinter.simpledialog.Dialog):
     BASIC = 1
     ALL = 2
 
     def __init__(self, parent, defaultfont=None, showstyles=None):
-        self._family = tkinter.tix.StringVar(value='Ariel')
-        self._sizeString = tkinter.tix.StringVar(value='12')
-        self._weight = tkinter.tix.StringVar(value=tkinter.font.NORMAL)
-        self._slant = tkinter.tix.StringVar(value=tkinter.font.ROMAN)
-        self._isUnderline = tkinter.tix.BooleanVar(value=False)
-        self._isOverstrike = tkinter.tix.BooleanVar(value=False)
+        self._family = StringVar(value='Ariel')
+        self._sizeString = StringVar(value='12')
+        self._weight = StringVar(value=tkinter.font.NORMAL)
+        self._slant = StringVar(value=tkinter.font.ROMAN)
+        self._isUnderline = BooleanVar(value=False)
+        self._isOverstrike = BooleanVar(value=False)
 
         if defaultfont:
             self._initialize(defaultfont)
@@ -28,6 +42,8 @@ class FontChooser(tkinter.simpledialog.Dialog):
 
         self.sampleText = None
 
+        self._previewAfterId = None
+
         tkinter.simpledialog.Dialog.__init__(self, parent, 'Font Chooser')
 
     def _initialize(self, aFont):
@@ -46,99 +62,151 @@ class FontChooser(tkinter.simpledialog.Dialog):
     def body(self, master):
         theRow = 0
 
-        tkinter.tix.Label(master, text="Font Family").grid(row=theRow, column=0)
-        tkinter.tix.Label(master, text="Font Size").grid(row=theRow, column=2)
+        Label(master, text="Font Family").grid(row=theRow, column=0, sticky=W, padx=10)
+        Label(master, text="Font Size").grid(row=theRow, column=2, sticky=W, padx=10)
 
         theRow += 1
 
-        # Font Families
-        fontList = tkinter.tix.ComboBox(master, command=self.selectionChanged, dropdown=False, editable=False,
-                                        selectmode=tkinter.tix.IMMEDIATE, variable=self._family)
-        fontList.grid(row=theRow, column=0, columnspan=2,
-                      sticky=tkinter.tix.N + tkinter.tix.S + tkinter.tix.E + tkinter.tix.W, padx=10)
-        first = None
-        familyList = list(tkinter.font.families())
-        familyList.sort()
-        last = -1
-        select = -1
-        for family in familyList:
-            if family[0] == '@':
-                continue
-            if first is None:
-                first = family
-
-            fontList.insert(tkinter.tix.END, family)
-
-            last += 1
-            if self._family.get() == family:
-                select = last
-
-        # fontList.configure(value=first)
-        if select != -1:
-            fontList.pick(select)
-        else:
-            fontList.pick(last)
+        # Filter
+        self._filterString = StringVar()
+        filterEntry = Entry(master, textvariable=self._filterString)
+        filterEntry.grid(row=theRow, column=0, columnspan=2, sticky=E + W, padx=10)
+        self._filterString.trace('w', self.filterChanged)
+
+        theRow += 1
+
+        # Font Families, filled a chunk at a time so the dialog shows at once
+        familyFrame = Frame(master)
+        familyFrame.grid(row=theRow, column=0, columnspan=2, sticky=N + S + E + W, padx=10)
+        self._familyList = Listbox(familyFrame, exportselection=False, height=12)
+        familyScroll = Scrollbar(familyFrame, command=self._familyList.yview)
+        self._familyList.configure(yscrollcommand=familyScroll.set)
+        self._familyList.pack(side=LEFT, fill=BOTH, expand=True)
+        familyScroll.pack(side=RIGHT, fill=Y)
+        self._familyList.bind('<<ListboxSelect>>', self.familySelected)
+
+        self._shownFamilies = []
+        self._fillAfterId = None
+        self.showFamilies(getFontFamilies(master))
 
         # Font Sizes
-        sizeList = tkinter.tix.ComboBox(master, command=self.selectionChanged, dropdown=False, editable=False,
-                                        selectmode=tkinter.tix.IMMEDIATE, variable=self._sizeString)
-        sizeList.grid(row=theRow, column=2, columnspan=2,
-                      sticky=tkinter.tix.N + tkinter.tix.S + tkinter.tix.E + tkinter.tix.W, padx=10)
-
-        last = -1
-        select = -1
-        for size in range(6, 200):
-            sizeList.insert(tkinter.tix.END, '%d' % size)
-            last += 1
-            if self._sizeString.get() == str(size):
-                select = last
-
-        # sizeList.configure(value='9')
-        if select != -1:
-            sizeList.pick(select)
+        sizeFrame = Frame(master)
+        sizeFrame.grid(row=theRow - 1, rowspan=2, column=2, columnspan=2, sticky=N + S + E + W, padx=10)
+        self._sizeList = Listbox(sizeFrame, exportselection=False, width=6, height=12)
+        sizeScroll = Scrollbar(sizeFrame, command=self._sizeList.yview)
+        self._sizeList.configure(yscrollcommand=sizeScroll.set)
+        self._sizeList.pack(side=LEFT, fill=BOTH, expand=True)
+        sizeScroll.pack(side=RIGHT, fill=Y)
+        self._sizeList.bind('<<ListboxSelect>>', self.sizeSelected)
+
+        sizes = ['%d' % size for size in FONT_SIZES]
+        self._sizeList.insert(END, *sizes)
+        if self._sizeString.get() in sizes:
+            select = sizes.index(self._sizeString.get())
         else:
-            sizeList.pick(last)
+            select = len(sizes) - 1
+        self._sizeList.selection_set(select)
+        self._sizeList.see(select)
 
         # Styles
         if self._showStyles is not None:
             theRow += 1
 
             if self._showStyles in (FontChooser.ALL, FontChooser.BASIC):
-                tkinter.tix.Label(master, text='Styles', anchor=tkinter.tix.W).grid(row=theRow, column=0, pady=10,
-                                                                                    sticky=tkinter.tix.W)
+                Label(master, text='Styles', anchor=W).grid(row=theRow, column=0, pady=10, sticky=W)
 
                 theRow += 1
 
-                tkinter.tix.Checkbutton(master, text="bold", command=self.selectionChanged, offvalue='normal',
-                                        onvalue='bold', variable=self._weight).grid(row=theRow, column=0)
-                tkinter.tix.Checkbutton(master, text="italic", command=self.selectionChanged, offvalue='roman',
-                                        onvalue='italic', variable=self._slant).grid(row=theRow, column=1)
+                Checkbutton(master, text="bold", command=self.selectionChanged, offvalue='normal',
+                            onvalue='bold', variable=self._weight).grid(row=theRow, column=0)
+                Checkbutton(master, text="italic", command=self.selectionChanged, offvalue='roman',
+                            onvalue='italic', variable=self._slant).grid(row=theRow, column=1)
 
             if self._showStyles == FontChooser.ALL:
-                tkinter.tix.Checkbutton(master, text="underline", command=self.selectionChanged, offvalue=False,
-                                        onvalue=True, variable=self._isUnderline).grid(row=theRow, column=2)
-                tkinter.tix.Checkbutton(master, text="overstrike", command=self.selectionChanged, offvalue=False,
-                                        onvalue=True, variable=self._isOverstrike).grid(row=theRow, column=3)
+                Checkbutton(master, text="underline", command=self.selectionChanged, offvalue=False,
+                            onvalue=True, variable=self._isUnderline).grid(row=theRow, column=2)
+                Checkbutton(master, text="overstrike", command=self.selectionChanged, offvalue=False,
+                            onvalue=True, variable=self._isOverstrike).grid(row=theRow, column=3)
 
         # Sample Text
         theRow += 1
 
-        tkinter.tix.Label(master, text='Sample Text', anchor=tkinter.tix.W).grid(row=theRow, column=0, pady=10,
-                                                                                 sticky=tkinter.tix.W)
+        Label(master, text='Sample Text', anchor=W).grid(row=theRow, column=0, pady=10, sticky=W)
 
         theRow += 1
 
-        self.sampleText = tkinter.tix.Text(master, height=11, width=70)
-        self.sampleText.insert(tkinter.tix.INSERT,
+        self.sampleText = Text(master, height=11, width=70)
+        self.sampleText.insert(INSERT,
                                'ABCDEFGHIJKLMNOPQRSTUVWXYZ\nabcdefghijklmnopqrstuvwxyz', 'fontStyle')
-        self.sampleText.config(state=tkinter.tix.DISABLED)
+        self.sampleText.config(state=DISABLED)
         self.sampleText.tag_config('fontStyle', font=self._currentFont)
         self.sampleText.grid(row=theRow, column=0, columnspan=4, padx=10)
 
     def apply(self):
         self.result = self.getFontTuple()
 
+    def destroy(self):
+        for afterId in (self._fillAfterId, self._previewAfterId):
+            if afterId is not None:
+                self.after_cancel(afterId)
+        self._fillAfterId = self._previewAfterId = None
+        tkinter.simpledialog.Dialog.destroy(self)
+
+    def showFamilies(self, families):
+        if self._fillAfterId is not None:
+            self.after_cancel(self._fillAfterId)
+            self._fillAfterId = None
+
+        self._familyList.delete(0, END)
+        self._shownFamilies = families
+        self.fillFamilies(0)
+
+    def fillFamilies(self, start):
+        chunk = self._shownFamilies[start:start + FILL_CHUNK]
+        self._familyList.insert(END, *chunk)
+
+        family = self._family.get()
+        if family in chunk:
+            select = start + chunk.index(family)
+            self._familyList.selection_set(select)
+            self._familyList.see(select)
+
+        if start + FILL_CHUNK < len(self._shownFamilies):
+            self._fillAfterId = self.after_idle(self.fillFamilies, start + FILL_CHUNK)
+        else:
+            self._fillAfterId = None
+            if self._shownFamilies and not self._familyList.curselection():
+                # the family is not installed or filtered out, pick the first one shown
+                self._familyList.selection_set(0)
+                self._familyList.see(0)
+                self.familySelected()
+
+    def filterChanged(self, *args):
+        text = self._filterString.get().strip().lower()
+        families = getFontFamilies(self)
+        if text:
+            families = [f for f in families if text in f.lower()]
+        self.showFamilies(families)
+
+    def familySelected(self, event=None):
+        selection = self._familyList.curselection()
+        if selection:
+            self._family.set(self._familyList.get(selection[0]))
+            self.selectionChanged()
+
+    def sizeSelected(self, event=None):
+        selection = self._sizeList.curselection()
+        if selection:
+            self._sizeString.set(self._sizeList.get(selection[0]))
+            self.selectionChanged()
+
     def selectionChanged(self, something=None):
+        # at most one preview per PREVIEW_DELAY while scrolling through the lists
+        if self._previewAfterId is None:
+            self._previewAfterId = self.after(PREVIEW_DELAY, self.updatePreview)
+
+    def updatePreview(self):
+        self._previewAfterId = None
         self._currentFont.configure(family=self._family.get(), size=self._sizeString.get(),
                                     weight=self._weight.get(), slant=self._slant.get(),
                                     underline=self._isUnderline.get(),
@@ -172,7 +240,7 @@ def askChooseFont(parent, defaultfont=None, showstyles=FontChooser.ALL):
 
 
 if __name__ == '__main__':
-    root = tkinter.tix.Tk()
+    root = Tk()
     font = askChooseFont(root)
 
     if font:
@@ -0,0 +1,57 @@
+# -*- coding: utf-8 -*-
+
+# Frame scheduler on top of Tk's after()
+#
+# Ticks only between start() and stop(). Each frame is scheduled against a
+# fixed timeline measured with perf_counter, so slow callbacks shorten the
+# next wait instead of drifting, and frames that are already late are
+# dropped rather than queued up.
+
+
+import time
+
+
+class FrameScheduler(object):
+    def __init__(self, root, callback, fps=60):
+        self.root = root
+        self.callback = callback
+        self.period = 1.0 / fps
+        self.frame_time = 0.0
+        self._after_id = None
+        self._next = 0.0
+        self._last = 0.0
+
+    @property
+    def running(self):
+        return self._after_id is not None
+
+    def start(self):
+        if self.running:
+            return
+
+        self._last = self._next = time.perf_counter()
+        self._after_id = self.root.after_idle(self._tick)
+
+    def stop(self):
+        if self._after_id is not None:
+            self.root.after_cancel(self._after_id)
+            self._after_id = None
+
+    def _tick(self):
+        now = time.perf_counter()
+        self.frame_time = now - self._last
+        self._last = now
+
+        self.callback()
+        if self._after_id is None:
+            # stopped from inside the callback
+            return
+
+        self._next += self.period
+        now = time.perf_counter()
+        if self._next < now:
+            # late, skip the missed frames
+            self._next = now + self.period
+
+        delay = int((self._next - now) * 1000)
+        self._after_id = self.root.after(delay, self._tick)
@@ -0,0 +1,112 @@
+# -*- coding: utf-8 -*-
+
+# Background image cache
+#
+# Decoded images are cached by (path, mtime, screen size). Decoding and
+# fitting run on a worker thread; only the PhotoImage is created on the Tk
+# thread. While settings are being edited only the newest request is
+# decoded, older pending requests are dropped. PIL is imported on the worker
+# when the first image is needed, not at startup.
+
+
+import os
+import queue
+import threading
+from collections import OrderedDict
+
+
+MAX_CACHED_IMAGES = 4
+
+
+def fit_to_screen(image, size):
+    # the background label shows the centre of the image, crop the rest away
+    width, height = size
+    if image.width <= width and image.height <= height:
+        return image
+
+    left = max(0, (image.width - width) // 2)
+    top = max(0, (image.height - height) // 2)
+    return image.crop((left, top, left + min(width, image.width), top + min(height, image.height)))
+
+
+class BackgroundImageCache(object):
+    def __init__(self, tasks, size, fallback_path):
+        self.tasks = tasks
+        self.size = size
+        self.fallback_path = fallback_path
+        self._photos = OrderedDict()
+        self._jobs = queue.Queue()
+        self._wanted = None
+        self._callback = None
+        self._worker = threading.Thread(target=self._decode_loop, name='image-decode', daemon=True)
+        self._worker.start()
+
+    def make_key(self, path):
+        try:
+            mtime = os.stat(path).st_mtime
+        except OSError:
+            mtime = None
+        return path, mtime, self.size
+
+    def request(self, path, callback):
+        key = self.make_key(path)
+
+        photo = self._photos.get(key)
+        if photo is not None:
+            self._photos.move_to_end(key)
+            if self._wanted is not None:
+                self._wanted = None
+                self.tasks.release()
+            callback(photo)
+            return
+
+        self._callback = callback
+        if key == self._wanted:
+            return
+
+        if self._wanted is None:
+            self.tasks.acquire()
+        self._wanted = key
+        self._jobs.put(key)
+
+    def _decode_loop(self):
+        while True:
+            key = self._jobs.get()
+            while not self._jobs.empty():
+                key = self._jobs.get()
+
+            try:
+                from PIL import Image
+
+                image = Image.open(key[0])
+                image.load()
+                image = fit_to_screen(image, key[2])
+                error = None
+            except Exception as e:
+                image = None
+                error = e
+
+            self.tasks.post(self._on_decoded, key, image, error)
+
+    def _on_decoded(self, key, image, error):
+        if key != self._wanted:
+            # superseded by a newer request
+            return
+
+        self._wanted = None
+        self.tasks.release()
+
+        if error is not None:
+            print('background image', key[0], error)
+            if key[0] != self.fallback_path:
+                self.request(self.fallback_path, self._callback)
+            return
+
+        from PIL import ImageTk
+
+        photo = ImageTk.PhotoImage(image)
+        self._photos[key] = photo
+        while len(self._photos) > MAX_CACHED_IMAGES:
+            self._photos.popitem(last=False)
+
+        self._callback(photo)
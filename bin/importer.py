@@ -0,0 +1,291 @@
+# -*- coding: utf-8 -*-
+
+# Candidate import from HR exports
+#
+# Reads any number of .txt, .csv and .tsv files, drops duplicate people and
+# writes one LIST.txt the draw can load. Large files are cut into chunks at
+# line boundaries and parsed on a process pool; every worker opens the file
+# itself, so only the parsed rows travel back.
+#
+# Duplicates are found by a hash of a normalized key (NFKC, case folded,
+# whitespace collapsed), so "Alice  Smith" and "alice smith" are the same
+# person. The first occurrence wins. Duplicates and rejected lines are listed
+# with their file and line number.
+#
+#   python importer.py staff.csv contractors.tsv --column Name --weight-column Tickets
+#
+# --attribute-column copies a column into the list as key=value, named after
+# its header, for the eligibility filters of the draw:
+#
+#   python importer.py staff.csv --column Name --attribute-column Site --attribute-column Department
+#
+# Quoted CSV fields must not contain line breaks, chunks are cut at every
+# newline.
+
+
+import os
+import sys
+import csv
+import argparse
+import unicodedata
+from hashlib import blake2b
+from concurrent.futures import ProcessPoolExecutor
+
+
+IMPORT_CHUNK = 1 << 23  # bytes per worker task
+SERIAL_LIMIT = 1 << 24  # inputs smaller than this are parsed without a process pool
+KEY_DIGEST_SIZE = 16
+DELIMITERS = {'.csv': ',', '.tsv': '\t'}
+LIST_FILE = os.path.join(os.path.dirname(os.path.abspath(__file__)), '..', 'LIST.txt')
+
+
+def normalize_key(name):
+    if name.isascii():
+        return ' '.join(name.lower().split())
+    return ' '.join(unicodedata.normalize('NFKC', name).casefold().split())
+
+
+def file_format(path):
+    # delimiter of the file, None for plain one-name-per-line lists
+    return DELIMITERS.get(os.path.splitext(path)[1].lower())
+
+
+def chunk_ranges(path, start, chunk=IMPORT_CHUNK):
+    # [start, end) byte ranges that begin and end on line boundaries
+    size = os.path.getsize(path)
+    ranges = []
+    with open(path, 'rb') as source:
+        while start < size:
+            source.seek(min(start + chunk, size))
+            source.readline()
+            end = min(source.tell(), size)
+            ranges.append((start, end))
+            start = end
+    return ranges
+
+
+def read_header(path, encoding):
+    # header fields and the offset of the first data line
+    with open(path, 'rb') as source:
+        line = source.readline()
+    text = line.decode(encoding).lstrip('\ufeff').rstrip('\r\n')
+    return next(csv.reader([text], delimiter=file_format(path))), len(line)
+
+
+def attribute_field(key, value):
+    # one key=value field, tabs and line breaks would split the line
+    return '\t%s=%s' % (' '.join(key.replace('=', ' ').split()), ' '.join(value.split()))
+
+
+def column_index(header, column, path):
+    if column is None:
+        return None
+    if isinstance(column, int) or column.isdigit():
+        return int(column)
+    names = [field.strip().casefold() for field in header]
+    try:
+        return names.index(column.strip().casefold())
+    except ValueError:
+        raise Exception('column not found', column, path)
+
+
+def parse_chunk(task):
+    # runs in a worker: returns rows (digest, name, weight, line, attributes), rejects (line, reason, text), line count
+    path, start, end, delimiter, name_column, weight_column, attribute_columns, encoding = task
+    with open(path, 'rb') as source:
+        source.seek(start)
+        data = source.read(end - start)
+
+    rows = []
+    rejects = []
+    try:
+        texts = data.decode(encoding).split('\n')
+    except UnicodeDecodeError:
+        # decode line by line to find the bad ones
+        texts = []
+        for number, line in enumerate(data.split(b'\n')):
+            try:
+                texts.append(line.decode(encoding))
+            except UnicodeDecodeError:
+                rejects.append((number, 'not %s' % encoding, line.decode(encoding, 'replace')))
+                texts.append('')
+    if texts and not texts[-1]:
+        texts.pop()
+    if texts:
+        texts[0] = texts[0].lstrip('\ufeff')
+    if b'\r' in data:
+        texts = [text.rstrip('\r') for text in texts]
+
+    if delimiter is None:
+        # LIST.txt rules: an optional ticket count after a tab, anything else counts as one ticket
+        records = (text.split('\t') for text in texts)
+        name_column = 0
+        weight_column = 1
+    else:
+        records = csv.reader(texts, delimiter=delimiter)
+
+    for number, fields in enumerate(records):
+        if not ''.join(fields).strip():
+            continue
+        if name_column >= len(fields):
+            rejects.append((number, 'no name column', texts[number]))
+            continue
+
+        name = ' '.join(fields[name_column].split())
+        if not name:
+            rejects.append((number, 'empty name', texts[number]))
+            continue
+
+        weight = 1
+        if weight_column is not None and weight_column < len(fields) and fields[weight_column].strip():
+            try:
+                weight = int(fields[weight_column])
+            except ValueError:
+                if delimiter is None:
+                    weight = 1
+                else:
+                    rejects.append((number, 'invalid ticket count', texts[number]))
+                    continue
+            if weight <= 0 and delimiter is None:
+                # LIST.txt keeps such a candidate out of the draw, so does the imported list
+                weight = 0
+            elif weight <= 0:
+                rejects.append((number, 'ticket count not positive', texts[number]))
+                continue
+
+        if delimiter is None:
+            # key=value fields of a LIST.txt line are kept as they are
+            attributes = ''.join(attribute_field(*field.split('=', 1)) for field in fields[1:] if '=' in field)
+        else:
+            attributes = ''.join(attribute_field(key, fields[index]) for key, index in attribute_columns
+                                 if index < len(fields) and fields[index].strip())
+
+        # name has its whitespace collapsed already
+        key = name.lower() if name.isascii() else normalize_key(name)
+        rows.append((blake2b(key.encode('utf-8'), digest_size=KEY_DIGEST_SIZE).digest(), name, weight, number,
+                     attributes))
+
+    return rows, rejects, len(texts)
+
+
+class ImportResult(object):
+    def __init__(self):
+        self.names = []
+        self.weights = []
+        self.attributes = []  # '\tkey=value...' per name, may be empty
+        self.weighted = False
+        self.duplicates = []  # (path, line, name, first path, first line)
+        self.rejects = []  # (path, line, reason, text)
+        self.lines = 0
+
+    def write_list(self, path):
+        with open(path, 'wt', encoding='utf-8', newline='\n') as out:
+            if self.weighted:
+                for name, weight, attributes in zip(self.names, self.weights, self.attributes):
+                    out.write('%s\t%d%s\n' % (name, weight, attributes))
+            else:
+                for name, attributes in zip(self.names, self.attributes):
+                    out.write(name + attributes + '\n')
+
+    def write_report(self, path):
+        with open(path, 'wt', encoding='utf-8', newline='') as out:
+            writer = csv.writer(out, delimiter='\t')
+            writer.writerow(['kind', 'file', 'line', 'detail', 'text'])
+            for source, line, name, first_source, first_line in self.duplicates:
+                writer.writerow(['duplicate', source, line, 'first at %s:%d' % (first_source, first_line), name])
+            for source, line, reason, text in self.rejects:
+                writer.writerow(['rejected', source, line, reason, text])
+
+
+def import_files(paths, column=None, weight_column=None, encoding='utf-8', jobs=None, attribute_columns=()):
+    result = ImportResult()
+    tasks = []
+    for path in paths:
+        delimiter = file_format(path)
+        start = 0
+        name_index = weight_index = None
+        attribute_indexes = []
+        if delimiter is not None:
+            header, start = read_header(path, encoding)
+            name_index = column_index(header, column if column is not None else 0, path)
+            weight_index = column_index(header, weight_column, path)
+            result.weighted = result.weighted or weight_index is not None
+            for attribute_column in attribute_columns:
+                index = column_index(header, attribute_column, path)
+                attribute_indexes.append((header[index] if index < len(header) else attribute_column, index))
+        for chunk_start, chunk_end in chunk_ranges(path, start):
+            tasks.append((path, chunk_start, chunk_end, delimiter, name_index, weight_index, attribute_indexes,
+                          encoding))
+
+    jobs = jobs or os.cpu_count() or 1
+    if jobs == 1 or sum(task[2] - task[1] for task in tasks) < SERIAL_LIMIT:
+        chunks = map(parse_chunk, tasks)
+        executor = None
+    else:
+        executor = ProcessPoolExecutor(jobs)
+        chunks = executor.map(parse_chunk, tasks)
+
+    # chunks come back in task order, so line numbers and "first wins" stay stable
+    first_seen = {}
+    lines_before = {}  # lines of each file before the current chunk, header included
+    names = result.names
+    weights = result.weights
+    attributes = result.attributes
+    try:
+        for task, (rows, rejects, line_count) in zip(tasks, chunks):
+            path = task[0]
+            base = lines_before.get(path, 0 if task[3] is None else 1) + 1
+            lines_before[path] = base - 1 + line_count
+
+            for digest, name, weight, number, attribute_text in rows:
+                first = first_seen.get(digest)
+                if first is not None:
+                    result.duplicates.append((path, base + number, name, first[0], first[1]))
+                    continue
+                first_seen[digest] = (path, base + number)
+                names.append(name)
+                weights.append(weight)
+                attributes.append(attribute_text)
+            if not result.weighted:
+                result.weighted = any(row[2] != 1 for row in rows)
+
+            for number, reason, text in rejects:
+                result.rejects.append((path, base + number, reason, text))
+            result.lines += line_count
+    finally:
+        if executor is not None:
+            executor.shutdown()
+
+    result.rejects.sort(key=lambda reject: (paths.index(reject[0]), reject[1]))
+    return result
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description='Merge candidate exports into one list without duplicates')
+    parser.add_argument('files', nargs='+', help='.txt, .csv or .tsv files, CSV/TSV files need a header line')
+    parser.add_argument('--column', help='name column of CSV/TSV files, header text or 0-based number (default 0)')
+    parser.add_argument('--weight-column', help='ticket count column of CSV/TSV files')
+    parser.add_argument('--attribute-column', action='append', default=[],
+                        help='CSV/TSV column written as key=value for eligibility filters, may be repeated')
+    parser.add_argument('--encoding', default='utf-8', help='encoding of the input files')
+    parser.add_argument('--output', default=LIST_FILE, help='list file to write (default: LIST.txt)')
+    parser.add_argument('--report', help='write duplicates and rejected lines to this TSV file')
+    parser.add_argument('--jobs', type=int, help='worker processes (default: one per CPU)')
+    args = parser.parse_args(argv)
+
+    result = import_files(args.files, args.column, args.weight_column, args.encoding, args.jobs,
+                          args.attribute_column)
+    result.write_list(args.output)
+    if args.report:
+        result.write_report(args.report)
+
+    print('%d lines read, %d candidates written to %s, %d duplicates, %d rejected'
+          % (result.lines, len(result.names), args.output, len(result.duplicates), len(result.rejects)))
+    if not args.report:
+        for source, line, reason, text in result.rejects[:20]:
+            print('rejected %s:%d: %s: %r' % (source, line, reason, text))
+    return 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())
@@ -0,0 +1,180 @@
+# -*- coding: utf-8 -*-
+
+# Opt-in instrumentation for the stage app
+#
+# Nothing here runs unless it is switched on with --profile (or
+# LUCKY_PROFILE=1). Then the hot RollingApp methods are wrapped with timers
+# on the class before the app is built, a probe measures how late Tk runs
+# its after() callbacks, and every frame time and STOP-to-result latency is
+# kept in a histogram. Without the flag the methods are the plain ones.
+#
+#   F11  shows or hides a live overlay
+#   F12  writes the numbers to ../profile/profile-<time>.json (also done on exit)
+
+
+import os
+import json
+import time
+import inspect
+import functools
+from collections import deque
+
+
+PROFILE_DIR = '../profile'
+TIMED_METHODS = ('rolling_update', 'update_info_display', 'on_setting_changed', 'read_candidates_list',
+                 'write_config_file', 'on_begin_rolling_button', 'on_end_rolling_button')
+BUCKETS_MS = (0.1, 0.25, 0.5, 1, 2, 4, 8, 16.7, 33.3, 66.7, 133, 266, 533, 1000)
+RECENT_SAMPLES = 4096  # samples kept for the percentiles
+LAG_INTERVAL = 50  # ms between event loop probes
+OVERLAY_INTERVAL = 500  # ms
+
+
+class Histogram(object):
+    def __init__(self):
+        self.counts = [0] * (len(BUCKETS_MS) + 1)
+        self.count = 0
+        self.total = 0.0
+        self.max = 0.0
+        self.recent = deque(maxlen=RECENT_SAMPLES)
+
+    def add(self, seconds):
+        ms = seconds * 1000
+        bucket = 0
+        while bucket < len(BUCKETS_MS) and ms > BUCKETS_MS[bucket]:
+            bucket += 1
+        self.counts[bucket] += 1
+        self.count += 1
+        self.total += ms
+        if ms > self.max:
+            self.max = ms
+        self.recent.append(ms)
+
+    def summary(self):
+        recent = sorted(self.recent)
+        if not recent:
+            return {'count': 0}
+        return {'count': self.count, 'mean_ms': self.total / self.count, 'max_ms': self.max,
+                'p50_ms': recent[len(recent) // 2], 'p99_ms': recent[min(len(recent) - 1, int(len(recent) * 0.99))],
+                'buckets_ms': dict(zip([str(bound) for bound in BUCKETS_MS] + ['inf'], self.counts))}
+
+
+class Instruments(object):
+    def __init__(self):
+        self.histograms = {}
+        self.started = time.time()
+        self.root = None
+        self._overlay = None
+        self._overlay_id = None
+        self._lag_due = 0.0
+        self._stop_time = None
+
+    def histogram(self, name):
+        histogram = self.histograms.get(name)
+        if histogram is None:
+            histogram = self.histograms[name] = Histogram()
+        return histogram
+
+    def timed(self, name, func):
+        histogram = self.histogram(name)
+        clock = time.perf_counter
+
+        @functools.wraps(func)
+        def wrapper(*args, **kwargs):
+            start = clock()
+            try:
+                return func(*args, **kwargs)
+            finally:
+                histogram.add(clock() - start)
+        return wrapper
+
+    def install(self, cls, names=TIMED_METHODS):
+        # wraps the methods on the class, before any instance binds them
+        for name in names:
+            method = inspect.getattr_static(cls, name)
+            if isinstance(method, staticmethod):
+                setattr(cls, name, staticmethod(self.timed(name, method.__func__)))
+            else:
+                setattr(cls, name, self.timed(name, method))
+
+        show_result = cls.show_result
+        on_end_rolling_button = cls.on_end_rolling_button
+        instruments = self
+
+        def timed_stop(app, *args):
+            instruments._stop_time = time.perf_counter()
+            return on_end_rolling_button(app, *args)
+
+        def timed_show_result(app, *args):
+            show_result(app, *args)
+            if instruments._stop_time is not None and app.root is not None:
+                # measured once Tk has drawn the result
+                app.root.after_idle(instruments._stop_done, instruments._stop_time)
+                instruments._stop_time = None
+
+        cls.on_end_rolling_button = functools.wraps(on_end_rolling_button)(timed_stop)
+        cls.show_result = functools.wraps(show_result)(timed_show_result)
+
+    def _stop_done(self, start):
+        self.histogram('stop_to_result').add(time.perf_counter() - start)
+
+    def attach(self, app):
+        # frame times, event loop lag, overlay and dump keys of a built app
+        self.root = app.root
+        frames = app._frames
+        callback = frames.callback
+        frame_times = self.histogram('frame_time')
+
+        def frame():
+            frame_times.add(frames.frame_time)
+            callback()
+        frames.callback = frame
+
+        self.root.bind('<F11>', lambda event: self.toggle_overlay(), add='+')
+        self.root.bind('<F12>', lambda event: print('Profile written to', self.dump()), add='+')
+        self._lag_due = time.perf_counter() + LAG_INTERVAL / 1000.0
+        self.root.after(LAG_INTERVAL, self._probe_lag)
+
+    def _probe_lag(self):
+        now = time.perf_counter()
+        self.histogram('loop_lag').add(max(0.0, now - self._lag_due))
+        self._lag_due = now + LAG_INTERVAL / 1000.0
+        self.root.after(LAG_INTERVAL, self._probe_lag)
+
+    def report(self):
+        return {'started': self.started, 'time': time.time(),
+                'histograms': {name: histogram.summary() for name, histogram in sorted(self.histograms.items())}}
+
+    def dump(self, path=None):
+        if path is None:
+            os.makedirs(PROFILE_DIR, exist_ok=True)
+            path = os.path.join(PROFILE_DIR, time.strftime('profile-%Y%m%d-%H%M%S.json'))
+        with open(path, 'wt', encoding='utf-8') as out:
+            json.dump(self.report(), out, indent='\t')
+        return path
+
+    def overlay_text(self):
+        lines = []
+        for name, histogram in sorted(self.histograms.items()):
+            if histogram.count:
+                summary = histogram.summary()
+                lines.append('%-24s p50 %7.2f  p99 %7.2f  max %8.2f ms  n %d'
+                             % (name, summary['p50_ms'], summary['p99_ms'], summary['max_ms'], summary['count']))
+        return '\n'.join(lines)
+
+    def toggle_overlay(self):
+        from tkinter import Label, LEFT, NW
+
+        if self._overlay is not None:
+            self.root.after_cancel(self._overlay_id)
+            self._overlay.destroy()
+            self._overlay = None
+            return
+
+        self._overlay = Label(self.root, font=('Courier', 10), justify=LEFT, anchor=NW, bg='black', fg='#00FF00')
+        self._overlay.place(x=0, y=0)
+        self._update_overlay()
+
+    def _update_overlay(self):
+        self._overlay.configure(text=self.overlay_text())
+        self._overlay.lift()
+        self._overlay_id = self.root.after(OVERLAY_INTERVAL, self._update_overlay)
@@ -0,0 +1,371 @@
+# -*- coding: utf-8 -*-
+
+# Crash-safe draw journal
+#
+# Every winner and reset is appended to a line-based JSON journal. Writes are
+# flushed at once but fsync'ed in batches. Every few hundred events the pool
+# state is written to a snapshot that also records the journal offset it
+# covers, so resuming reads the snapshot and replays only the journal tail.
+#
+# With a counter-based generator the journal also records the seed and the
+# generator position after every winner. Replaying the journal from that
+# seed repeats every draw exactly, which is what `python journal.py replay`
+# checks for auditors.
+#
+# Candidates appended to the list while the app runs are recorded as a
+# 'grow' entry with the fingerprint and size of the longer list. A restart
+# resumes the pool at the size of the snapshot or of the 'open' entry when
+# the journal after it grew to the current list, and replaying each 'grow'
+# appends the candidates at the live boundary of that moment, as the
+# running app did.
+# When earlier lines changed the list is read again and a new journal is
+# started; the winners found in the new list are written as 'carry' entries
+# and stay removed.
+#
+# A winner drawn under an eligibility filter records the filter, replay
+# draws it from the same eligible set.
+
+
+import os
+import sys
+import json
+import time
+import hashlib
+import argparse
+from array import array
+from bisect import bisect_left
+
+from drawpool import DrawPool
+from philox import PhiloxRandom
+from candidatelist import MappedCandidateList
+from attributes import AttributeIndex, parse_filter
+
+
+JOURNAL_SYNC_EVENTS = 16
+JOURNAL_SYNC_INTERVAL = 1.0  # sec
+SNAPSHOT_EVENTS = 256
+
+
+def list_fingerprint(candidates):
+    digest = hashlib.blake2b(digest_size=16)
+    digest.update(str(len(candidates)).encode())
+    if hasattr(candidates, 'content_digest'):
+        # kept by the list scan, so this reads no file content
+        digest.update(candidates.content_digest())
+    else:
+        for i in range(len(candidates)):
+            digest.update(candidates[i].encode('utf-8') + b'\n')
+    return digest.hexdigest()
+
+
+class DrawJournal(object):
+    def __init__(self, path, snapshot_path):
+        self.path = path
+        self.snapshot_path = snapshot_path
+        self.fingerprint = None
+        self.rng = None
+        self.round = 0
+        self._file = None
+        self._unsynced = 0
+        self._last_sync = 0.0
+        self._since_snapshot = 0
+
+    def open(self, pool, fingerprint, rng=None):
+        # restores pool (and rng) from snapshot + journal tail, returns replayed event count
+        directory = os.path.dirname(self.path)
+        if directory:
+            os.makedirs(directory, exist_ok=True)
+
+        self.fingerprint = fingerprint
+        self.rng = rng
+        offset = self._load_snapshot(pool)
+        replayed = self._replay(pool, offset)
+
+        self._file = open(self.path, 'ab')
+        if self._file.tell() == 0:
+            entry = {'op': 'open', 'list': fingerprint, 'size': pool.total, 'time': time.time()}
+            if rng is not None:
+                entry['seed'] = rng.seed_value
+                entry['rng'] = rng.tell()
+            self._append(entry)
+            self.sync()
+        if self._file.tell() < offset:
+            # journal lost behind the snapshot, start over from the snapshot
+            self.write_snapshot(pool)
+        return replayed
+
+    def _load_snapshot(self, pool):
+        try:
+            with open(self.snapshot_path, 'rb') as snapshot:
+                header = json.loads(snapshot.readline().decode('utf-8'))
+                order = array(header['typecode'])
+                order.frombytes(snapshot.read())
+        except (OSError, ValueError, KeyError):
+            return self._check_journal_list(pool)
+
+        if header.get('list') != self.fingerprint and not self._grew_to_list(header['offset'], pool.total):
+            self._archive()
+            return 0
+
+        pool.set_state(order, header['live'])
+        self.round = header['round']
+        if self.rng is not None and 'seed' in header:
+            self.rng.seed(header['seed'])
+            self.rng.seek(header['rng'])
+        return header['offset']
+
+    def _check_journal_list(self, pool):
+        # no snapshot yet, the journal must belong to the same list
+        try:
+            with open(self.path, 'rb') as journal:
+                first = json.loads(journal.readline().decode('utf-8'))
+        except (OSError, ValueError):
+            return 0
+
+        if first.get('list') != self.fingerprint and not self._grew_to_list(0, pool.total):
+            self._archive()
+        else:
+            # the replayed 'grow' entries append the candidates added since
+            size = first.get('size', pool.total)
+            pool.set_state(range(size), size)
+            if self.rng is not None and 'seed' in first:
+                self.rng.seed(first['seed'])
+                self.rng.seek(first.get('rng', 0))
+        return 0
+
+    def _grew_to_list(self, offset, size):
+        # True when the last 'grow' after offset is to the current list
+        last = None
+        try:
+            with open(self.path, 'rb') as journal:
+                journal.seek(offset)
+                for line in journal:
+                    try:
+                        entry = json.loads(line.decode('utf-8'))
+                    except ValueError:
+                        break
+                    if entry.get('op') == 'grow':
+                        last = entry
+        except OSError:
+            return False
+        return last is not None and last['list'] == self.fingerprint and last['size'] == size
+
+    def _archive(self):
+        # journal and snapshot of another list are kept aside, not replayed
+        stamp = time.strftime('%Y%m%d-%H%M%S')
+        for path in (self.path, self.snapshot_path):
+            if os.path.exists(path):
+                os.replace(path, '%s.%s' % (path, stamp))
+        print('journal belongs to another list, archived with suffix', stamp)
+
+    def _replay(self, pool, offset):
+        replayed = 0
+        try:
+            journal = open(self.path, 'r+b')
+        except OSError:
+            return 0
+
+        with journal:
+            journal.seek(offset)
+            good = offset
+            for line in journal:
+                try:
+                    entry = json.loads(line.decode('utf-8'))
+                except ValueError:
+                    break
+                if not line.endswith(b'\n'):
+                    break
+
+                self._apply(pool, entry)
+                good += len(line)
+                replayed += 1
+
+            # drop a torn last line left by a crash
+            journal.truncate(good)
+
+        return replayed
+
+    def _apply(self, pool, entry):
+        op = entry.get('op')
+        if op == 'carry':
+            if pool.is_live(entry['id']):
+                pool.remove_id(entry['id'])
+        elif op == 'win':
+            if pool.is_live(entry['id']):
+                pool.remove_id(entry['id'])
+            self.round = entry['round']
+            if self.rng is not None and 'rng' in entry:
+                self.rng.seek(entry['rng'])
+        elif op == 'reset':
+            pool.reset()
+        elif op == 'grow':
+            pool.extend(entry['size'], pool.candidates.weights if pool.weighted else None)
+
+    def _append(self, entry):
+        self._file.write(json.dumps(entry, ensure_ascii=False).encode('utf-8') + b'\n')
+        self._file.flush()
+        self._unsynced += 1
+        if self._unsynced >= JOURNAL_SYNC_EVENTS or time.time() - self._last_sync >= JOURNAL_SYNC_INTERVAL:
+            self.sync()
+
+    def sync(self):
+        if self._file is None or not self._unsynced:
+            return
+        os.fsync(self._file.fileno())
+        self._unsynced = 0
+        self._last_sync = time.time()
+
+    def record_win(self, pool, candidate_id, name, eligible_filter=None):
+        if self._file is None:
+            return
+        entry = {'op': 'win', 'id': candidate_id, 'name': name, 'round': self.round, 'time': time.time()}
+        if eligible_filter:
+            entry['filter'] = eligible_filter
+        if self.rng is not None:
+            entry['rng'] = self.rng.tell()
+        self._append(entry)
+        self._event_done(pool)
+
+    def record_carry(self, pool, candidate_id, name):
+        # a winner of the list before a full reload, removed again without a draw
+        if self._file is None:
+            return
+        self._append({'op': 'carry', 'id': candidate_id, 'name': name, 'time': time.time()})
+        self._event_done(pool)
+
+    def record_reset(self, pool):
+        if self._file is None:
+            return
+        self._append({'op': 'reset', 'time': time.time()})
+        self._event_done(pool)
+
+    def record_grow(self, pool, fingerprint):
+        if self._file is None:
+            return
+        # no snapshot here, resuming replays the growth from the journal
+        self.fingerprint = fingerprint
+        self._append({'op': 'grow', 'list': fingerprint, 'size': pool.total, 'time': time.time()})
+        self._event_done(pool)
+
+    def winner_names(self):
+        # candidate id -> name of every winner since the journal was started
+        names = {}
+        try:
+            journal = open(self.path, 'rb')
+        except OSError:
+            return names
+        with journal:
+            for line in journal:
+                try:
+                    entry = json.loads(line.decode('utf-8'))
+                except ValueError:
+                    continue
+                if entry.get('op') in ('win', 'carry'):
+                    names[entry['id']] = entry['name']
+        return names
+
+    def next_round(self):
+        self.round += 1
+        return self.round
+
+    def _event_done(self, pool):
+        self._since_snapshot += 1
+        if self._since_snapshot >= SNAPSHOT_EVENTS:
+            self.write_snapshot(pool)
+
+    def write_snapshot(self, pool):
+        self.sync()
+        order, live = pool.get_state()
+        header = {'list': self.fingerprint, 'offset': self._file.tell(), 'live': live, 'round': self.round,
+                  'typecode': order.typecode, 'time': time.time()}
+        if self.rng is not None:
+            header['seed'] = self.rng.seed_value
+            header['rng'] = self.rng.tell()
+
+        temp_path = self.snapshot_path + '.tmp'
+        with open(temp_path, 'wb') as snapshot:
+            snapshot.write(json.dumps(header).encode('utf-8') + b'\n')
+            order.tofile(snapshot)
+            snapshot.flush()
+            os.fsync(snapshot.fileno())
+        os.replace(temp_path, self.snapshot_path)
+        self._since_snapshot = 0
+
+    def close(self, pool=None):
+        if self._file is None:
+            return
+        if pool is not None and self._since_snapshot:
+            self.write_snapshot(pool)
+        self.sync()
+        self._file.close()
+        self._file = None
+
+
+def replay(journal_path, list_path):
+    # re-runs every draw from the journal's seed, returns the mismatching entries
+    candidates = MappedCandidateList(list_path, attributes=AttributeIndex())
+    with open(journal_path, 'rb') as journal:
+        entries = [json.loads(line.decode('utf-8')) for line in journal]
+    # the list must be the one the journal saw last, grown or not
+    lists = [entry['list'] for entry in entries if entry.get('op') in ('open', 'grow')]
+    if not lists or lists[-1] != list_fingerprint(candidates):
+        raise Exception('journal was written for another list', list_path)
+
+    pool = None
+    eligible = None  # (filter, EligiblePool) while consecutive wins use one filter
+    mismatches = []
+    draws = 0
+
+    for number, entry in enumerate(entries, 1):
+        op = entry.get('op')
+        if op == 'open':
+            if 'seed' not in entry:
+                raise Exception('journal has no seed, it cannot be replayed')
+            size = entry.get('size', len(candidates))
+            weights = candidates.weights[:size] if candidates.weights is not None else None
+            pool = DrawPool(range(size), weights, PhiloxRandom(entry['seed']))
+            pool.rng.seek(entry.get('rng', 0))
+        elif op == 'grow':
+            pool.extend(entry['size'], candidates.weights)
+            eligible = None
+        elif op == 'carry':
+            pool.remove_id(entry['id'])
+            eligible = None
+        elif op == 'win':
+            if 'filter' in entry:
+                if eligible is None or eligible[0] != entry['filter']:
+                    ids = candidates.attributes.select(parse_filter(entry['filter']))
+                    # the index covers the whole list, the pool may not have grown that far yet
+                    eligible = (entry['filter'], pool.eligible(ids[:bisect_left(ids, pool.total)]))
+                winner = eligible[1].draw()
+            else:
+                winner = pool.remove(pool.rand_index())
+                eligible = None
+            draws += 1
+            if winner != entry['id'] or pool.rng.tell() != entry.get('rng', pool.rng.tell()):
+                mismatches.append((number, entry['id'], winner))
+        elif op == 'reset':
+            pool.reset()
+            eligible = None
+
+    candidates.close()
+    return draws, mismatches
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description='Draw journal tools')
+    commands = parser.add_subparsers(dest='command', required=True)
+    replay_parser = commands.add_parser('replay', help='re-run all draws of a journal and compare the winners')
+    replay_parser.add_argument('journal', help='journal file, e.g. ../journal/draw.journal')
+    replay_parser.add_argument('list', help='the candidate list the journal was written for')
+    args = parser.parse_args(argv)
+
+    draws, mismatches = replay(args.journal, args.list)
+    for number, expected, got in mismatches:
+        print('line %d: journal has winner %d, replay drew %d' % (number, expected, got))
+    print('%d draws replayed, %d mismatches' % (draws, len(mismatches)))
+    return 1 if mismatches else 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())
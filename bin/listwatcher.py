@@ -0,0 +1,88 @@
+# -*- coding: utf-8 -*-
+
+# Polling watcher for the candidate list
+#
+# Every LIST_POLL_INTERVAL the Tk thread stats the list file, which works
+# without any file system notification service. When its inode, size or
+# mtime changed, a worker thread hashes the bytes that were indexed before
+# and the Tk thread is told whether the file was only appended to or changed
+# before the old end.
+
+
+import os
+import threading
+
+from candidatelist import file_starts_with
+
+
+LIST_POLL_INTERVAL = 1000  # ms
+
+
+def file_state(path):
+    try:
+        stat = os.stat(path)
+    except OSError:
+        return None
+    return stat.st_ino, stat.st_size, stat.st_mtime_ns
+
+
+class ListWatcher(object):
+    def __init__(self, root, tasks, path, callback, interval=LIST_POLL_INTERVAL):
+        # callback(appended) runs on the Tk thread
+        self.root = root
+        self.tasks = tasks
+        self.path = path
+        self.callback = callback
+        self.interval = interval
+        self.candidates = None
+        self._state = None
+        self._checking = False
+        self._after_id = None
+
+    def watch(self, candidates):
+        # called with every freshly loaded list
+        self.candidates = candidates
+        self._state = file_state(self.path)
+
+    def start(self):
+        if self._after_id is None:
+            self._after_id = self.root.after(self.interval, self._poll)
+
+    def stop(self):
+        if self._after_id is not None:
+            self.root.after_cancel(self._after_id)
+            self._after_id = None
+
+    def recheck(self):
+        # look at the file again on the next poll even if it did not change
+        self._state = None
+
+    def _poll(self):
+        self._after_id = self.root.after(self.interval, self._poll)
+        if self._checking or self.candidates is None:
+            return
+
+        state = file_state(self.path)
+        # a write between indexing and watch() shows as a size the scan did not reach
+        if state == self._state and (state is None or state[1] == self.candidates.scanned_size):
+            return
+        self._state = state
+        if state is None:
+            # renamed away while an editor saves, look again next time
+            return
+
+        candidates = self.candidates
+        self._checking = True
+        self.tasks.acquire()
+        threading.Thread(target=self._check, args=(candidates, candidates.scanned_size, candidates.content_digest()),
+                         name='list-check', daemon=True).start()
+
+    def _check(self, candidates, size, digest):
+        appended = file_starts_with(self.path, size, digest)
+        self.tasks.post(self._checked, candidates, appended)
+
+    def _checked(self, candidates, appended):
+        self._checking = False
+        self.tasks.release()
+        if candidates is self.candidates:
+            self.callback(appended)
@@ -0,0 +1,48 @@
+# -*- coding: utf-8 -*-
+
+# Hand results from worker threads to the Tk thread
+#
+# Tk may only be touched from the thread running mainloop. Workers post
+# callables here and the Tk thread drains them with after(). Polling only
+# runs while some user holds the queue, so an idle app schedules nothing.
+
+
+import queue
+
+
+class MainThreadQueue(object):
+    def __init__(self, root, interval=10):
+        self.root = root
+        self.interval = interval  # ms
+        self._queue = queue.Queue()
+        self._users = 0
+        self._after_id = None
+
+    def post(self, func, *args):
+        # safe from any thread
+        self._queue.put((func, args))
+
+    def acquire(self):
+        self._users += 1
+        if self._after_id is None:
+            self._after_id = self.root.after(self.interval, self._poll)
+
+    def release(self):
+        self._users -= 1
+
+    def run_pending(self):
+        # on the Tk thread, e.g. when a worker woke it up with a virtual event
+        while True:
+            try:
+                func, args = self._queue.get_nowait()
+            except queue.Empty:
+                break
+            func(*args)
+
+    def _poll(self):
+        self.run_pending()
+
+        if self._users > 0:
+            self._after_id = self.root.after(self.interval, self._poll)
+        else:
+            self._after_id = None
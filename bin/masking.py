@@ -0,0 +1,143 @@
+# -*- coding: utf-8 -*-
+
+# Masked names for the Mask mode
+#
+# Names are masked per grapheme cluster, so a base letter keeps its combining
+# marks and emoji sequences, flags and Hangul jamo count as one letter.
+# MaskCache keeps the masked form of every candidate for the current visible
+# counts, filling itself on a background thread once masking is used.
+
+
+import threading
+import unicodedata
+
+
+MASK_CHAR = '*'
+MASK_PREBUILD_LIMIT = 1000000  # candidates masked ahead of time
+
+ZWJ = '\u200d'
+
+
+def _extends(ch):
+    # characters that belong to the cluster before them
+    code = ord(ch)
+    if ch == ZWJ or unicodedata.combining(ch) or unicodedata.category(ch) in ('Mn', 'Me', 'Mc'):
+        return True
+    return (0xfe00 <= code <= 0xfe0f or 0xe0100 <= code <= 0xe01ef  # variation selectors
+            or 0x1f3fb <= code <= 0x1f3ff  # skin tone modifiers
+            or 0xe0020 <= code <= 0xe007f)  # tag sequences
+
+
+def _is_regional_indicator(ch):
+    return 0x1f1e6 <= ord(ch) <= 0x1f1ff
+
+
+def _hangul_joins(prev, ch):
+    # leading jamo + vowel jamo + trailing jamo make one syllable
+    p, c = ord(prev), ord(ch)
+    if 0x1100 <= p <= 0x115f:
+        return 0x1100 <= c <= 0x11a7
+    if 0x1160 <= p <= 0x11a7:
+        return 0x1160 <= c <= 0x11ff
+    if 0x11a8 <= p <= 0x11ff:
+        return 0x11a8 <= c <= 0x11ff
+    return False
+
+
+def graphemes(text):
+    clusters = []
+    for ch in text:
+        if clusters:
+            last = clusters[-1]
+            prev = last[-1]
+            if (_extends(ch) or prev == ZWJ or _hangul_joins(prev, ch)
+                    or (_is_regional_indicator(ch) and len(last) == 1 and _is_regional_indicator(prev))):
+                clusters[-1] = last + ch
+                continue
+        clusters.append(ch)
+    return clusters
+
+
+def mask_name(name, left, right):
+    if name.isascii():
+        parts = name
+    else:
+        parts = graphemes(name)
+
+    total = len(parts)
+    if left + right >= total:
+        return name
+
+    head = ''.join(parts[0:left])
+    tail = ''.join(parts[total - right:]) if right else ''
+    return head + (total - left - right) * MASK_CHAR + tail
+
+
+class MaskCache(object):
+    def __init__(self):
+        self.candidates = ()
+        self.left = 0
+        self.right = 0
+        self._masked = []
+        self._generation = 0
+        self._builder = None
+
+    def load(self, candidates):
+        self.candidates = candidates
+        self.invalidate()
+
+    def set_visible(self, left, right):
+        if (left, right) != (self.left, self.right):
+            self.left = left
+            self.right = right
+            self.invalidate()
+
+    def invalidate(self):
+        self._stop_builder()
+        if len(self.candidates) <= MASK_PREBUILD_LIMIT:
+            self._masked = [None] * len(self.candidates)
+        else:
+            self._masked = {}
+
+    def extend(self):
+        # candidates were appended to the list, the names masked so far stay
+        if not isinstance(self._masked, list) or len(self.candidates) > MASK_PREBUILD_LIMIT:
+            self.invalidate()
+            return
+        self._stop_builder()
+        self._masked.extend([None] * (len(self.candidates) - len(self._masked)))
+
+    def _stop_builder(self):
+        # the builder checks the generation before every name, so this waits for one name at most
+        # and the caller may close or extend the list afterwards
+        self._generation += 1
+        if self._builder is not None:
+            self._builder.join()
+            self._builder = None
+
+    def get(self, candidate_id):
+        masked = self._masked[candidate_id] if isinstance(self._masked, list) else self._masked.get(candidate_id)
+        if masked is None:
+            masked = mask_name(self.candidates[candidate_id], self.left, self.right)
+            if isinstance(self._masked, dict) and len(self._masked) >= MASK_PREBUILD_LIMIT:
+                self._masked.clear()
+            self._masked[candidate_id] = masked
+
+        if self._builder is None and isinstance(self._masked, list):
+            self._builder = threading.Thread(target=self._build, args=(self._generation, self._masked),
+                                             name='mask-build', daemon=True)
+            self._builder.start()
+        return masked
+
+    def _build(self, generation, masked):
+        candidates = self.candidates
+        left, right = self.left, self.right
+        try:
+            for i in range(len(masked)):
+                if self._generation != generation:
+                    return
+                if masked[i] is None:
+                    masked[i] = mask_name(candidates[i], left, right)
+        except (TypeError, ValueError, IndexError):
+            # the list was closed while building, e.g. at exit
+            return
@@ -0,0 +1,181 @@
+# -*- coding: utf-8 -*-
+
+# Merkle commitment to the candidate list
+#
+# The tree follows RFC 9162 (Certificate Transparency v2): a leaf is
+# H(0x00 || line) and a node is H(0x01 || left || right), with BLAKE2b-256 as
+# H. A line is the candidate's line in LIST.txt without the line break and
+# surrounding spaces, so a ticket count after a tab is committed too. Leaf i
+# is candidate id i, the id the journal records for a winner.
+#
+# The tree is built while the list is indexed, one leaf per line and no second
+# pass, and it grows with lines appended later. Only the nodes from
+# STORED_LEVEL up are kept, about 4 bytes per candidate. The few nodes below
+# are rehashed from the candidate list when a proof needs them.
+#
+#   python merkle.py root ../LIST.txt
+#   python merkle.py prove ../LIST.txt 17 > proof.json
+#   python merkle.py verify proof.json --root <published root>
+
+
+import sys
+import json
+import argparse
+from hashlib import blake2b
+
+
+DIGEST_SIZE = 32
+STORED_LEVEL = 4  # subtrees of 16 leaves are rehashed for proofs
+
+
+def leaf_hash(line):
+    return blake2b(b'\x00' + line, digest_size=DIGEST_SIZE).digest()
+
+
+def node_hash(left, right):
+    return blake2b(b'\x01' + left + right, digest_size=DIGEST_SIZE).digest()
+
+
+def split_point(size):
+    # largest power of two smaller than size
+    return 1 << ((size - 1).bit_length() - 1)
+
+
+class MerkleTree(object):
+    def __init__(self):
+        self.size = 0
+        self.candidates = None  # gives raw(index) for the levels that are not stored
+        self._peaks = {}  # level -> root of the unpaired complete subtree at that level
+        self._levels = {}  # level -> bytearray of the complete nodes at that level
+
+    def extend(self, lines):
+        # hashes a batch level by level, an odd node waits in _peaks for its pair
+        nodes = list(map(leaf_hash, lines))
+        self.size += len(nodes)
+        level = 0
+        while nodes:
+            peak = self._peaks.pop(level, None)
+            if peak is not None:
+                nodes.insert(0, peak)
+            if len(nodes) & 1:
+                self._peaks[level] = nodes.pop()
+            nodes = list(map(node_hash, nodes[0::2], nodes[1::2]))
+            level += 1
+            if nodes and level >= STORED_LEVEL:
+                self._levels.setdefault(level, bytearray()).extend(b''.join(nodes))
+
+    @property
+    def root(self):
+        if not self._peaks:
+            return blake2b(b'', digest_size=DIGEST_SIZE).digest()
+        # the smallest subtree is the rightmost, fold towards the left
+        levels = sorted(self._peaks)
+        node = self._peaks[levels[0]]
+        for level in levels[1:]:
+            node = node_hash(self._peaks[level], node)
+        return node
+
+    def _subtree(self, start, size):
+        # hash of leaves [start, start + size)
+        if size & (size - 1) == 0 and start % size == 0:
+            level = size.bit_length() - 1
+            if level >= STORED_LEVEL:
+                offset = (start >> level) * DIGEST_SIZE
+                return bytes(self._levels[level][offset:offset + DIGEST_SIZE])
+            if level == 0:
+                return leaf_hash(self.candidates.raw(start))
+        half = split_point(size)
+        return node_hash(self._subtree(start, half), self._subtree(start + half, size - half))
+
+    def proof(self, index):
+        # audit path for a leaf, from the leaf up
+        if not 0 <= index < self.size:
+            raise IndexError('leaf index out of range', index)
+        path = []
+        start = 0
+        size = self.size
+        while size > 1:
+            half = split_point(size)
+            if index - start < half:
+                path.append(self._subtree(start + half, size - half))
+                size = half
+            else:
+                path.append(self._subtree(start, half))
+                start += half
+                size -= half
+        path.reverse()
+        return path
+
+    def proof_record(self, index):
+        return {'index': index, 'size': self.size, 'line': self.candidates.raw(index).decode('utf-8', 'replace'),
+                'path': [node.hex() for node in self.proof(index)], 'root': self.root.hex()}
+
+
+def verify(line, index, size, path, root):
+    # RFC 9162 section 2.1.3.2
+    if not 0 <= index < size:
+        return False
+    fn = index
+    sn = size - 1
+    node = leaf_hash(line)
+    for sibling in path:
+        if sn == 0:
+            return False
+        if fn & 1 or fn == sn:
+            node = node_hash(sibling, node)
+            while not fn & 1 and fn != 0:
+                fn >>= 1
+                sn >>= 1
+        else:
+            node = node_hash(node, sibling)
+        fn >>= 1
+        sn >>= 1
+    return sn == 0 and node == root
+
+
+def verify_record(record, root=None):
+    root = bytes.fromhex(root or record['root'])
+    path = [bytes.fromhex(node) for node in record['path']]
+    return verify(record['line'].encode('utf-8'), record['index'], record['size'], path, root)
+
+
+def main(argv=None):
+    from candidatelist import MappedCandidateList
+
+    parser = argparse.ArgumentParser(description='Commit to a candidate list and prove or check winners')
+    commands = parser.add_subparsers(dest='command', required=True)
+    root_parser = commands.add_parser('root', help='print the root of a list')
+    root_parser.add_argument('list')
+    prove_parser = commands.add_parser('prove', help='print inclusion proofs, one JSON line per candidate id')
+    prove_parser.add_argument('list')
+    prove_parser.add_argument('ids', type=int, nargs='+')
+    verify_parser = commands.add_parser('verify', help='check proofs without the list')
+    verify_parser.add_argument('proofs', help='file with one JSON proof per line, e.g. journal/proofs.jsonl')
+    verify_parser.add_argument('--root', help='the published root, default: the root stored in each proof')
+    args = parser.parse_args(argv)
+
+    if args.command == 'verify':
+        failed = 0
+        with open(args.proofs, 'rt', encoding='utf-8') as proofs:
+            for line in proofs:
+                if not line.strip():
+                    continue
+                record = json.loads(line)
+                ok = verify_record(record, args.root)
+                failed += not ok
+                print('%s id %d: %s' % ('OK ' if ok else 'BAD', record['index'], record['line']))
+        return 1 if failed else 0
+
+    tree = MerkleTree()
+    candidates = MappedCandidateList(args.list, tree)
+    if args.command == 'root':
+        print(tree.root.hex(), tree.size)
+    else:
+        for candidate_id in args.ids:
+            print(json.dumps(tree.proof_record(candidate_id), ensure_ascii=False))
+    candidates.close()
+    return 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())
@@ -0,0 +1,104 @@
+# -*- coding: utf-8 -*-
+
+# Counter-based random generator (Philox4x32-10)
+#
+# Output word n of a stream is a pure function of (seed, stream, n), so the
+# generator state is just a position that can be saved, restored or jumped
+# to in O(1). Different stream numbers under the same seed give independent
+# sequences, which lets batch and simulation workers draw in parallel
+# without sharing or locking a generator.
+#
+# PhiloxRandom is a random.Random, so randint(), randrange(), choice() and
+# shuffle() all work on top of it.
+
+
+import os
+import random
+import hashlib
+
+
+M32 = 0xffffffff
+PHILOX_M0 = 0xd2511f53
+PHILOX_M1 = 0xcd9e8d57
+PHILOX_W0 = 0x9e3779b9
+PHILOX_W1 = 0xbb67ae85
+PHILOX_ROUNDS = 10
+
+
+def philox4x32(counter, key):
+    c0, c1, c2, c3 = counter
+    k0, k1 = key
+    for _ in range(PHILOX_ROUNDS):
+        p0 = PHILOX_M0 * c0
+        p1 = PHILOX_M1 * c2
+        c0, c1, c2, c3 = ((p1 >> 32) ^ c1 ^ k0, p1 & M32, (p0 >> 32) ^ c3 ^ k1, p0 & M32)
+        k0 = (k0 + PHILOX_W0) & M32
+        k1 = (k1 + PHILOX_W1) & M32
+    return c0, c1, c2, c3
+
+
+def seed_to_key(seed):
+    if isinstance(seed, int) and 0 <= seed <= 0xffffffffffffffff:
+        value = seed
+    else:
+        value = int.from_bytes(hashlib.blake2b(str(seed).encode('utf-8'), digest_size=8).digest(), 'little')
+    return value & M32, value >> 32
+
+
+class PhiloxRandom(random.Random):
+    def __init__(self, seed=None, stream=0):
+        self.stream = stream
+        self._position = 0
+        self._block_index = -1
+        self._block = None
+        super().__init__(seed)
+
+    def seed(self, a=None, version=2):
+        if a is None:
+            a = int.from_bytes(os.urandom(8), 'little')
+        self.seed_value = a
+        self._key = seed_to_key(a)
+        self._block_index = -1  # the cached block belongs to the old key
+        self.seek(0)
+
+    def spawn(self, stream):
+        # an independent generator sharing this seed
+        return PhiloxRandom(self.seed_value, stream)
+
+    def tell(self):
+        return self._position
+
+    def seek(self, position):
+        self._position = position
+
+    def getstate(self):
+        return self.seed_value, self.stream, self._position
+
+    def setstate(self, state):
+        seed, self.stream, position = state
+        self.seed(seed)
+        self.seek(position)
+
+    def _next32(self):
+        block_index, word = divmod(self._position, 4)
+        if block_index != self._block_index:
+            counter = (block_index & M32, (block_index >> 32) & M32, self.stream & M32, (self.stream >> 32) & M32)
+            self._block = philox4x32(counter, self._key)
+            self._block_index = block_index
+        self._position += 1
+        return self._block[word]
+
+    def getrandbits(self, k):
+        if k < 0:
+            raise ValueError('number of bits must be non-negative')
+        value = 0
+        bits = 0
+        while bits < k:
+            value |= self._next32() << bits
+            bits += 32
+        return value & ((1 << k) - 1)
+
+    def random(self):
+        a = self._next32() >> 5
+        b = self._next32() >> 6
+        return (a * 67108864.0 + b) * (1.0 / 9007199254740992.0)
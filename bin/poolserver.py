@@ -0,0 +1,237 @@
+# -*- coding: utf-8 -*-
+
+# Shared candidate pool for several draw stations
+#
+# One server process owns the pool and is the only place winners are drawn,
+# so two stations can never pick the same person. Stations connect over
+# loopback TCP or a Unix socket and exchange one JSON object per line:
+#
+#   station -> server   {"cmd": "begin"}, {"cmd": "stop", "count": 3}, {"cmd": "reset"}
+#   server -> stations  {"event": "welcome", ...}, {"event": "state", "state": "ROLLING"},
+#                       {"event": "winners", "ids": [...], "names": [...], "round": 1},
+#                       {"event": "reset"}, {"event": "error", "message": "..."}
+#
+# Every event is broadcast to all stations, so they roll and stop together.
+#
+#   python poolserver.py ../LIST.txt --address 127.0.0.1:8642
+#   python GoLucky.py --connect 127.0.0.1:8642
+
+
+import os
+import sys
+import json
+import socket
+import asyncio
+import argparse
+import threading
+
+from drawpool import DrawPool, MAX_BATCH_SIZE
+from philox import PhiloxRandom
+from candidatelist import MappedCandidateList
+from journal import DrawJournal, list_fingerprint
+
+
+DEFAULT_ADDRESS = '127.0.0.1:8642'
+JOURNAL_DIR = os.path.join(os.path.dirname(os.path.abspath(__file__)), '..', 'journal')
+SERVER_JOURNAL_FILE = os.path.join(JOURNAL_DIR, 'server.journal')
+SERVER_SNAPSHOT_FILE = os.path.join(JOURNAL_DIR, 'server.snapshot')
+
+
+def parse_address(address):
+    # 'host:port' or 'unix:/path/to/socket'
+    if address.startswith('unix:'):
+        return 'unix', address[len('unix:'):]
+    host, _, port = address.rpartition(':')
+    return 'tcp', (host or '127.0.0.1', int(port))
+
+
+def encode(message):
+    return json.dumps(message, ensure_ascii=False).encode('utf-8') + b'\n'
+
+
+def set_no_delay(sock):
+    if sock is not None and sock.family in (socket.AF_INET, socket.AF_INET6):
+        sock.setsockopt(socket.IPPROTO_TCP, socket.TCP_NODELAY, 1)
+
+
+class PoolServer(object):
+    def __init__(self, candidates, journal=None, seed=None):
+        self.candidates = candidates
+        self.rng = PhiloxRandom(seed)
+        self.pool = DrawPool(candidates, candidates.weights, self.rng)
+        self.fingerprint = list_fingerprint(candidates)
+        self.journal = journal
+        self.state = 'WELCOME'
+        self.round = 0
+        self._writers = set()
+
+        if journal is not None:
+            journal.open(self.pool, self.fingerprint, self.rng)
+            self.round = journal.round
+
+    def welcome(self):
+        return {'event': 'welcome', 'state': self.state, 'list': self.fingerprint, 'total': self.pool.total,
+                'live': len(self.pool), 'removed': list(self.pool.winners()), 'round': self.round}
+
+    def handle(self, message):
+        # returns the event to broadcast, or an error for the sender only
+        cmd = message.get('cmd')
+        if cmd == 'begin':
+            if self.state == 'ROLLING':
+                return None, None
+            if not self.pool.can_draw():
+                return None, {'event': 'error', 'message': 'No more candidates'}
+            self.state = 'ROLLING'
+            return {'event': 'state', 'state': self.state}, None
+
+        if cmd == 'stop':
+            try:
+                count = int(message.get('count', 1))
+            except (TypeError, ValueError):
+                return None, {'event': 'error', 'message': 'Invalid count %r' % (message.get('count'),)}
+            if self.state != 'ROLLING':
+                # another station stopped first
+                return None, None
+            self.state = 'RESULT'
+            return self.draw(max(1, min(count, MAX_BATCH_SIZE))), None
+
+        if cmd == 'reset':
+            self.pool.reset()
+            if self.journal is not None:
+                self.journal.record_reset(self.pool)
+            return {'event': 'reset'}, None
+
+        return None, {'event': 'error', 'message': 'Unknown command %r' % cmd}
+
+    def draw(self, count):
+        if self.journal is not None:
+            self.round = self.journal.next_round()
+        else:
+            self.round += 1
+
+        # journaled one by one, each entry keeps the generator position after its own draw
+        winners = []
+        names = []
+        while len(winners) < count and self.pool.can_draw():
+            winner = self.pool.draw()
+            winners.append(winner)
+            names.append(self.candidates[winner])
+            if self.journal is not None:
+                self.journal.record_win(self.pool, winner, names[-1])
+        return {'event': 'winners', 'ids': winners, 'names': names, 'round': self.round}
+
+    async def broadcast(self, message):
+        data = encode(message)
+        writers = list(self._writers)
+        for writer in writers:
+            writer.write(data)
+        await asyncio.gather(*(writer.drain() for writer in writers), return_exceptions=True)
+
+    async def on_station(self, reader, writer):
+        set_no_delay(writer.get_extra_info('socket'))
+        self._writers.add(writer)
+        writer.write(encode(self.welcome()))
+        try:
+            while True:
+                line = await reader.readline()
+                if not line:
+                    break
+                try:
+                    message = json.loads(line.decode('utf-8'))
+                except ValueError:
+                    continue
+                if not isinstance(message, dict):
+                    continue
+
+                event, error = self.handle(message)
+                if error is not None:
+                    writer.write(encode(error))
+                if event is not None:
+                    await self.broadcast(event)
+        except ConnectionError:
+            pass
+        finally:
+            self._writers.discard(writer)
+            writer.close()
+
+    async def serve(self, address):
+        kind, where = parse_address(address)
+        if kind == 'unix':
+            server = await asyncio.start_unix_server(self.on_station, path=where)
+        else:
+            server = await asyncio.start_server(self.on_station, where[0], where[1])
+        print('pool server on', address, 'with', self.pool.total, 'candidates')
+        async with server:
+            await server.serve_forever()
+
+
+class PoolClient(object):
+    def __init__(self, address, tasks, on_event):
+        self.address = address
+        self.tasks = tasks
+        self.on_event = on_event
+        self._sock = None
+        self._reader = None
+
+    def connect(self):
+        kind, where = parse_address(self.address)
+        if kind == 'unix':
+            self._sock = socket.socket(socket.AF_UNIX, socket.SOCK_STREAM)
+        else:
+            self._sock = socket.socket(socket.AF_INET, socket.SOCK_STREAM)
+        self._sock.connect(where)
+        set_no_delay(self._sock)
+
+        self.tasks.acquire()
+        self._reader = threading.Thread(target=self._read_loop, name='pool-client', daemon=True)
+        self._reader.start()
+
+    def send(self, message):
+        self._sock.sendall(encode(message))
+
+    def _read_loop(self):
+        stream = self._sock.makefile('rb')
+        try:
+            for line in stream:
+                try:
+                    message = json.loads(line.decode('utf-8'))
+                except ValueError:
+                    continue
+                self.tasks.post(self.on_event, message)
+        except OSError:
+            pass
+        self.tasks.post(self.on_event, {'event': 'disconnected'})
+
+    def close(self):
+        if self._sock is not None:
+            try:
+                # wakes the reader thread, close() alone does not
+                self._sock.shutdown(socket.SHUT_RDWR)
+            except OSError:
+                pass
+            self._sock.close()
+            self._sock = None
+            self.tasks.release()
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description='Serve one candidate pool to several draw stations')
+    parser.add_argument('list', help='candidate list file')
+    parser.add_argument('--address', default=DEFAULT_ADDRESS, help="'host:port' or 'unix:/path'")
+    parser.add_argument('--no-journal', action='store_true', help='do not journal or resume winners')
+    parser.add_argument('--seed', type=int, default=None, help='seed for a new journal, a resumed one keeps its seed')
+    args = parser.parse_args(argv)
+
+    journal = None if args.no_journal else DrawJournal(SERVER_JOURNAL_FILE, SERVER_SNAPSHOT_FILE)
+    server = PoolServer(MappedCandidateList(args.list), journal, args.seed)
+    try:
+        asyncio.run(server.serve(args.address))
+    except KeyboardInterrupt:
+        pass
+    finally:
+        if journal is not None:
+            journal.close(server.pool)
+
+
+if __name__ == '__main__':
+    sys.exit(main())
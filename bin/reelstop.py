@@ -0,0 +1,43 @@
+# -*- coding: utf-8 -*-
+
+# Slot machine style stop
+#
+# The winner is drawn first. A reel of names ending with the winner is then
+# laid out over a fixed number of frames with an ease-out curve, so the
+# names change fast at first and slower towards the end. Playback only looks
+# up the precomputed text for the elapsed time, no random numbers or string
+# work happens per frame, and dropped frames do not stretch the animation.
+
+
+import time
+
+
+REEL_DURATION = 2.5  # seconds
+REEL_STEPS = 24  # names shown before the winner
+
+
+def reel_positions(steps, frame_count):
+    # reel position (0..steps) for every frame, cubic ease-out
+    if frame_count < 2:
+        return [steps] * frame_count
+    last = frame_count - 1
+    return [round(steps * (1.0 - (1.0 - frame / last) ** 3)) for frame in range(frame_count)]
+
+
+class ReelStop(object):
+    def __init__(self, names, fps, duration=REEL_DURATION):
+        # names run from the first reel name to the winner
+        positions = reel_positions(len(names) - 1, max(1, int(duration * fps)))
+        self.frames = [names[position] for position in positions]
+        self.fps = fps
+        self.start = None
+
+    def frame(self):
+        # text for the current frame, None once the reel has stopped
+        now = time.perf_counter()
+        if self.start is None:
+            self.start = now
+        index = int((now - self.start) * self.fps)
+        if index >= len(self.frames):
+            return None
+        return self.frames[index]
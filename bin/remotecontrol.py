@@ -0,0 +1,229 @@
+# -*- coding: utf-8 -*-
+
+# Remote control for the stage
+#
+# An asyncio server on its own thread accepts one JSON object per line, so a
+# presenter can drive the draw from a phone or a laptop on the network:
+#
+#   client -> app   {"cmd": "begin"}, {"cmd": "stop"}, {"cmd": "reset"}, {"cmd": "status"}
+#                   an optional "id" is echoed in the reply, and "token" when the app requires one,
+#                   begin takes an optional "filter" for the eligible candidates
+#   app -> client   {"event": "ack", "id": ..., "cmd": "stop", "latency": 0.004, ...}
+#                   {"event": "state", "state": "ROLLING"}, {"event": "reset"},
+#                   {"event": "winners", "ids": [...], "names": [...]}
+#
+# Commands run on the Tk thread through a MainThreadQueue. The server thread
+# wakes Tk with a virtual event for every command, so nothing is polled while
+# nobody sends one; only a Tcl built without threads falls back to polling
+# every few milliseconds. The ack is sent once Tk is idle again, after the
+# screen was updated, and "latency" is the time from reading the command to
+# that point.
+#
+#   python GoLucky.py --remote 0.0.0.0:8643
+#   python remotecontrol.py 127.0.0.1:8643 begin
+#   python remotecontrol.py 127.0.0.1:8643 ping --count 100
+
+
+import sys
+import json
+import time
+import socket
+import asyncio
+import argparse
+import threading
+from collections import deque
+from tkinter import TclError
+
+from mainthread import MainThreadQueue
+from poolserver import parse_address, encode, set_no_delay
+
+
+DEFAULT_REMOTE_ADDRESS = '127.0.0.1:8643'
+REMOTE_POLL_INTERVAL = 4  # ms, well under one 60 fps frame, only without a threaded Tcl
+REMOTE_EVENT = '<<RemoteCommand>>'
+LATENCY_HISTORY = 1000
+
+
+class RemoteControl(object):
+    def __init__(self, root, address, handler, token=None):
+        # handler(message) runs on the Tk thread and returns the reply dict
+        self.root = root
+        self.address = address
+        self.handler = handler
+        self.token = token
+        self.tasks = MainThreadQueue(root, REMOTE_POLL_INTERVAL)
+        # a threaded Tcl takes calls from the server thread, the queue then runs on an event
+        self._wake = root.tk.eval('set tcl_platform(threaded)') == '1'
+        self.latencies = deque(maxlen=LATENCY_HISTORY)
+        self._loop = None
+        self._server = None
+        self._writers = set()
+        self._thread = None
+
+    def start(self):
+        ready = threading.Event()
+        errors = []
+        self._thread = threading.Thread(target=self._run, args=(ready, errors), name='remote-control', daemon=True)
+        self._thread.start()
+        ready.wait()
+        if errors:
+            raise errors[0]
+        if self._wake:
+            self.root.bind(REMOTE_EVENT, lambda event: self.tasks.run_pending(), add='+')
+        else:
+            self.tasks.acquire()
+
+    def _run(self, ready, errors):
+        self._loop = asyncio.new_event_loop()
+        try:
+            self._server = self._loop.run_until_complete(self._listen())
+        except OSError as e:
+            errors.append(e)
+            ready.set()
+            return
+        ready.set()
+        self._loop.run_forever()
+
+        self._server.close()
+        self._loop.run_until_complete(self._server.wait_closed())
+        self._loop.close()
+
+    async def _listen(self):
+        kind, where = parse_address(self.address)
+        if kind == 'unix':
+            return await asyncio.start_unix_server(self.on_client, path=where)
+        return await asyncio.start_server(self.on_client, where[0], where[1])
+
+    def stop(self):
+        if self._loop is not None and self._thread.is_alive():
+            self._loop.call_soon_threadsafe(self._loop.stop)
+            if not self._wake:
+                self.tasks.release()
+
+    def broadcast(self, message):
+        # from the Tk thread
+        if self._loop is not None:
+            self._loop.call_soon_threadsafe(self._write_all, encode(message))
+
+    def _write_all(self, data):
+        for writer in self._writers:
+            if not writer.is_closing():
+                writer.write(data)
+
+    def _write(self, writer, data):
+        if not writer.is_closing():
+            writer.write(data)
+
+    async def on_client(self, reader, writer):
+        set_no_delay(writer.get_extra_info('socket'))
+        self._writers.add(writer)
+        try:
+            while True:
+                line = await reader.readline()
+                if not line:
+                    break
+                received = time.perf_counter()
+                try:
+                    message = json.loads(line.decode('utf-8'))
+                except ValueError:
+                    writer.write(encode({'event': 'error', 'message': 'not JSON'}))
+                    continue
+                if self.token is not None and message.get('token') != self.token:
+                    writer.write(encode({'event': 'error', 'id': message.get('id'), 'message': 'bad token'}))
+                    continue
+                self.tasks.post(self._run_command, message, received, writer)
+                if self._wake:
+                    self._wake_tk()
+        except ConnectionError:
+            pass
+        finally:
+            self._writers.discard(writer)
+            writer.close()
+
+    def _wake_tk(self):
+        # from the server thread, tkinter hands the call over to the Tk thread
+        try:
+            self.root.event_generate(REMOTE_EVENT, when='tail')
+        except (RuntimeError, TclError):
+            # the window is closing
+            pass
+
+    def _run_command(self, message, received, writer):
+        # on the Tk thread
+        reply = self.handler(message)
+        self.root.after_idle(self._send_reply, reply, message, received, writer)
+
+    def _send_reply(self, reply, message, received, writer):
+        latency = time.perf_counter() - received
+        self.latencies.append(latency)
+        reply.update({'id': message.get('id'), 'cmd': message.get('cmd'), 'latency': latency})
+        self._loop.call_soon_threadsafe(self._write, writer, encode(reply))
+
+    def latency_report(self):
+        if not self.latencies:
+            return {}
+        values = sorted(self.latencies)
+        return {'p50': values[len(values) // 2], 'p99': values[min(len(values) - 1, int(len(values) * 0.99))],
+                'max': values[-1], 'count': len(values)}
+
+
+def request(sock, stream, message):
+    # sends one command and waits for its ack, returns (ack, round trip seconds)
+    start = time.perf_counter()
+    sock.sendall(encode(message))
+    for line in stream:
+        reply = json.loads(line.decode('utf-8'))
+        if reply.get('id') == message.get('id') and reply.get('event') in ('ack', 'error'):
+            return reply, time.perf_counter() - start
+    raise ConnectionError('connection closed')
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description='Drive a running Lucky Draw from the command line')
+    parser.add_argument('address', nargs='?', default=DEFAULT_REMOTE_ADDRESS, help="'host:port' or 'unix:/path'")
+    parser.add_argument('command', choices=('begin', 'stop', 'reset', 'status', 'watch', 'ping'))
+    parser.add_argument('--token', help='token the app was started with')
+    parser.add_argument('--count', type=int, default=100, help='status requests sent by ping')
+    parser.add_argument('--filter', help="eligible candidates for begin, e.g. 'site=Berlin', '' for everyone")
+    args = parser.parse_args(argv)
+
+    kind, where = parse_address(args.address)
+    sock = socket.socket(socket.AF_UNIX if kind == 'unix' else socket.AF_INET, socket.SOCK_STREAM)
+    sock.connect(where)
+    set_no_delay(sock)
+    stream = sock.makefile('rb')
+
+    def command(cmd, number):
+        message = {'cmd': cmd, 'id': number}
+        if cmd == 'begin' and args.filter is not None:
+            message['filter'] = args.filter
+        if args.token:
+            message['token'] = args.token
+        return request(sock, stream, message)
+
+    if args.command == 'watch':
+        for line in stream:
+            print(line.decode('utf-8').rstrip())
+    elif args.command == 'ping':
+        server = []
+        round_trip = []
+        for number in range(args.count):
+            reply, elapsed = command('status', number)
+            server.append(reply['latency'])
+            round_trip.append(elapsed)
+        server.sort()
+        round_trip.sort()
+        print('command to screen: p50 %.2f ms, max %.2f ms' % (server[len(server) // 2] * 1000, server[-1] * 1000))
+        print('round trip:        p50 %.2f ms, max %.2f ms'
+              % (round_trip[len(round_trip) // 2] * 1000, round_trip[-1] * 1000))
+    else:
+        reply, elapsed = command(args.command, 0)
+        print(json.dumps(reply, ensure_ascii=False))
+        print('round trip %.2f ms' % (elapsed * 1000))
+
+    sock.close()
+    return 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())
@@ -0,0 +1,125 @@
+# -*- coding: utf-8 -*-
+
+# Main text renderers
+#
+# LabelRenderer is the classic display, a full screen background Label with
+# the text Label on top of it. CanvasRenderer draws both on one Canvas and
+# keeps the most recently shown texts as laid out, hidden text items, so a
+# repeated name is shown by swapping which item is visible instead of
+# laying the text out again. prepare() lays out the next frame's text while
+# Tk is idle between frames.
+
+
+from collections import OrderedDict
+from tkinter import *
+
+
+TEXT_CACHE_SIZE = 256  # laid out text items kept on the canvas
+
+
+class LabelRenderer(object):
+    caches_text = False
+
+    def __init__(self, root):
+        self.bg_image = None
+
+        self.bg_label = Label(root)
+        self.bg_label.place(x=0, y=0, relwidth=1, relheight=1)
+
+        self.info_label = Label(root, fg='red')
+
+    def set_background_image(self, photo):
+        self.bg_image = photo
+        self.bg_label.configure(image=self.bg_image)
+
+    def set_background_color(self, color):
+        self.bg_label.configure(bg=color)
+        self.info_label.configure(bg=color)
+
+    def set_style(self, font, fg):
+        self.info_label.configure(font=font, fg=fg)
+
+    def set_position(self, x, y):
+        self.info_label.place(x=x, y=y, anchor=CENTER)
+
+    def show(self, text):
+        self.info_label.configure(text=text)
+
+    def prepare(self, text):
+        pass
+
+
+class CanvasRenderer(object):
+    caches_text = True
+
+    def __init__(self, root, cache_size=TEXT_CACHE_SIZE):
+        self.cache_size = cache_size
+        self.bg_image = None
+        self.font = None
+        self.fg = 'red'
+        self.x = 0
+        self.y = 0
+        self._items = OrderedDict()  # text -> canvas item, least recently shown first
+        self._shown = None
+        self._shown_text = None
+
+        self.canvas = Canvas(root, highlightthickness=0, borderwidth=0)
+        self.canvas.place(x=0, y=0, relwidth=1, relheight=1)
+        self._bg_item = self.canvas.create_image(root.winfo_screenwidth() // 2, root.winfo_screenheight() // 2,
+                                                 anchor=CENTER)
+
+    def set_background_image(self, photo):
+        self.bg_image = photo
+        self.canvas.itemconfigure(self._bg_item, image=self.bg_image)
+
+    def set_background_color(self, color):
+        self.canvas.configure(bg=color)
+
+    def set_style(self, font, fg):
+        self.font = font
+        self.fg = fg
+        text = self._shown_text
+        self.clear()
+        if text is not None:
+            self.show(text)
+
+    def set_position(self, x, y):
+        self.canvas.move('text', x - self.x, y - self.y)
+        self.x = x
+        self.y = y
+
+    def clear(self):
+        self.canvas.delete('text')
+        self._items.clear()
+        self._shown = None
+        self._shown_text = None
+
+    def show(self, text):
+        item = self._item(text)
+        if item != self._shown:
+            if self._shown is not None:
+                self.canvas.itemconfigure(self._shown, state=HIDDEN)
+            self.canvas.itemconfigure(item, state=NORMAL)
+            self._shown = item
+            self._shown_text = text
+
+    def prepare(self, text):
+        self._item(text)
+
+    def _item(self, text):
+        item = self._items.get(text)
+        if item is not None:
+            self._items.move_to_end(text)
+            return item
+
+        item = self.canvas.create_text(self.x, self.y, text=text, font=self.font, fill=self.fg, justify=CENTER,
+                                       anchor=CENTER, state=HIDDEN, tags='text')
+        self._items[text] = item
+        while len(self._items) > self.cache_size:
+            old_text, old = self._items.popitem(last=False)
+            if old == self._shown:
+                # never drop the visible text, keep it as the newest instead
+                self._items[old_text] = old
+                continue
+            self.canvas.delete(old)
+        return item
@@ -0,0 +1,69 @@
+# -*- coding: utf-8 -*-
+
+# Paginated grid of winners for batch draws
+
+
+from tkinter import *
+
+
+GRID_COLUMNS = 5
+GRID_ROWS = 10
+
+
+class ResultGrid(object):
+    def __init__(self, parent, columns=GRID_COLUMNS, rows=GRID_ROWS):
+        self.columns = columns
+        self.rows = rows
+        self.names = []
+        self.page = 0
+
+        self.frame = Frame(parent)
+        self.cells = []
+        for i in range(columns * rows):
+            cell = Label(self.frame)
+            cell.grid(row=i // columns, column=i % columns, padx=12, pady=2)
+            self.cells.append(cell)
+
+        self.page_label = Label(self.frame)
+        self.page_label.grid(row=rows, column=0, columnspan=columns)
+
+    @property
+    def page_size(self):
+        return self.columns * self.rows
+
+    @property
+    def page_count(self):
+        return max(1, (len(self.names) + self.page_size - 1) // self.page_size)
+
+    def configure(self, **options):
+        for cell in self.cells:
+            cell.configure(**options)
+        self.page_label.configure(**options)
+
+    def show(self, names, page=0):
+        self.names = names
+        self.set_page(page)
+
+    def set_page(self, page):
+        self.page = max(0, min(page, self.page_count - 1))
+        first = self.page * self.page_size
+        shown = self.names[first:first + self.page_size]
+        for i, cell in enumerate(self.cells):
+            cell.configure(text=shown[i] if i < len(shown) else '')
+
+        if self.page_count > 1:
+            self.page_label.configure(text='%d / %d' % (self.page + 1, self.page_count))
+        else:
+            self.page_label.configure(text='')
+
+    def next_page(self):
+        self.set_page(self.page + 1)
+
+    def prev_page(self):
+        self.set_page(self.page - 1)
+
+    def place(self, **options):
+        self.frame.place(**options)
+
+    def hide(self):
+        self.frame.place_forget()
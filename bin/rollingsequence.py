@@ -0,0 +1,68 @@
+# -*- coding: utf-8 -*-
+
+# Pre-generated index sequence for the rolling display
+#
+# The flashing names during ROLLING are display only, the winner is drawn at
+# STOP. Instead of asking the generator for one index per frame, indices are
+# generated a chunk at a time, with NumPy when it is installed and with
+# random.choices() otherwise, and each frame just takes the next one. Both
+# generators are seeded from the display stream, so the draw stream is never
+# touched.
+
+
+import random
+
+
+ROLLING_CHUNK = 1024  # indices per refill, about 17 s at 60 fps
+
+_numpy = None
+
+
+def _load_numpy():
+    # imported on first use, NumPy is optional and slow to import
+    global _numpy
+    if _numpy is None:
+        try:
+            import numpy
+            _numpy = numpy
+        except ImportError:
+            _numpy = False
+    return _numpy
+
+
+class RollingSequence(object):
+    def __init__(self, rng, chunk=ROLLING_CHUNK):
+        self.rng = rng
+        self.chunk = chunk
+        self._indices = []
+        self._next = 0
+        self._bound = 0
+        self._generator = None
+
+    def next_index(self, bound):
+        # an index in range(bound)
+        if bound != self._bound or self._next >= len(self._indices):
+            self._fill(bound)
+        index = self._indices[self._next]
+        self._next += 1
+        return index
+
+    def peek(self, bound):
+        # the index next_index(bound) will return
+        if bound != self._bound or self._next >= len(self._indices):
+            self._fill(bound)
+        return self._indices[self._next]
+
+    def _fill(self, bound):
+        numpy = _load_numpy()
+        if numpy:
+            if self._generator is None:
+                self._generator = numpy.random.default_rng(self.rng.getrandbits(64))
+            # tolist() so every frame gets a plain int without a NumPy scalar lookup
+            self._indices = self._generator.integers(0, bound, self.chunk).tolist()
+        else:
+            if self._generator is None:
+                self._generator = random.Random(self.rng.getrandbits(64))
+            self._indices = self._generator.choices(range(bound), k=self.chunk)
+        self._bound = bound
+        self._next = 0
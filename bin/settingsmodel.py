@@ -0,0 +1,34 @@
+# -*- coding: utf-8 -*-
+
+# Indexed settings model
+#
+# Settings stay a JSON list of [name, type, value] entries so the config
+# files keep their format, with a name -> position index on the side.
+
+
+import copy
+
+
+class Settings(list):
+    def __init__(self, entries=()):
+        super().__init__(entries)
+        self._index = dict((entry[0], i) for i, entry in enumerate(self))
+
+    def __deepcopy__(self, memo):
+        return Settings(copy.deepcopy(list(self), memo))
+
+    def __contains__(self, name):
+        return name in self._index
+
+    def index_of(self, name):
+        return self._index[name]
+
+    def get_value(self, name):
+        return self[self._index[name]][2]
+
+    def set_value(self, name, value):
+        self[self._index[name]][2] = value
+
+    def diff(self, other):
+        # positions whose value differs from other
+        return [i for i, (mine, theirs) in enumerate(zip(self, other)) if mine[2] != theirs[2]]
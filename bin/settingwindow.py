@@ -0,0 +1,332 @@
+# -*- coding: utf-8 -*-
+
+# Settings dialog of the lucky draw program
+#
+# Imported the first time the gear button is pressed. The font, color and
+# file dialogs are imported when their buttons are used.
+
+
+import os
+import copy
+import tkinter.font
+import tkinter.messagebox
+import tkinter.ttk
+from tkinter import *
+from functools import partial
+
+
+SETTINGS_APPLY_DELAY = 16  # ms, coalesce setting edits within one frame
+
+
+class SettingWindow:
+    def __init__(self, parent):
+
+        self.dirty = False
+
+        self.mute_notify = False
+
+        self.current_row = 0
+
+        self.settings = copy.deepcopy(parent.settings)
+
+        self._changed = set()
+
+        self._apply_id = None
+
+        self.controls = {}
+
+        self.parent = parent
+
+        self.root = Toplevel()
+        self.root.transient(parent.root)
+
+        self.root.resizable(0, 0)
+
+        self.root.protocol('WM_DELETE_WINDOW', self.on_cancel)
+
+        self.frame = Frame(self.root)
+
+        for s in self.parent.settings:
+            self.create_option(s)
+
+        self.separator = tkinter.ttk.Separator(self.frame)
+        self.separator.grid(row=self.current_row, column=0, columnspan=2, sticky='ew', pady=20)
+        self.current_row += 1
+
+        self.button_frame = Frame(self.frame)
+
+        self.default_button = Button(self.button_frame, text='Default', command=self.on_default).grid(row=0, column=0,
+                                                                                                      padx=4, pady=10,
+                                                                                                      sticky=S)
+        self.cancel_button = Button(self.button_frame, text='Cancel', command=self.on_cancel).grid(row=0, column=1,
+                                                                                                   padx=4, pady=10,
+                                                                                                   sticky=S)
+        self.save_button = Button(self.button_frame, text='Save', command=self.on_save).grid(row=0, column=2, padx=4,
+                                                                                             pady=10, sticky=S)
+
+        self.button_frame.grid(row=self.current_row, column=1)
+
+        self.frame.pack(padx=8, pady=8)
+
+        self.update_title()
+
+        # self.set_to_center()
+
+    def set_to_center(self):
+        self.root.update_idletasks()
+        width = self.root["width"] != 0 and self.root["width"] or self.root.winfo_width()
+        height = self.root["height"] != 0 and self.root["height"] or self.root.winfo_height()
+        win_width, win_height = self.root.winfo_screenwidth(), self.root.winfo_screenheight()
+        self.root.geometry(
+            '%dx%d+%d+%d' % (width, height, (win_width / 2) - (width / 2), (win_height / 2) - (height / 2)))
+
+    def create_option(self, opt):
+        t = opt[1]
+        if t == 'int':
+            c, v = self.create_int_option(opt[0], opt[2])
+        elif t == 'text':
+            c, v = self.create_text_option(opt[0], opt[2])
+        elif t == 'font':
+            c, v = self.create_font_option(opt[0], opt[2])
+        elif t == 'color':
+            c, v = self.create_color_option(opt[0], opt[2])
+        elif t == 'path':
+            c, v = self.create_path_option(opt[0], opt[2])
+        else:
+            raise Exception('Unknown option type', opt)
+
+        self.controls[opt[0]] = (c, v)
+
+    def create_int_option(self, name, v):
+        value = IntVar()
+        value.set(v[2])
+        value.trace("w", partial(self.on_int_variable, name))
+
+        left = Label(self.frame, text=name, anchor=W)
+        right = Scale(self.frame, orient=HORIZONTAL, variable=value, from_=v[0], to=v[1])
+        left.grid(row=self.current_row, column=0, sticky=E + W, pady=0)
+        right.grid(row=self.current_row, column=1, sticky=E + W, pady=0)
+
+        self.current_row += 1
+
+        return right, value
+
+    def create_text_option(self, name, v):
+        value = StringVar()
+        value.set(v)
+        value.trace("w", partial(self.on_text_variable, name))
+
+        left = Label(self.frame, text=name, anchor=W)
+        right = Entry(self.frame, textvariable=value)
+        left.grid(row=self.current_row, column=0, sticky=E + W, pady=0)
+        right.grid(row=self.current_row, column=1, sticky=E + W, pady=0)
+
+        self.current_row += 1
+
+        return right, value
+
+    def create_font_option(self, name, v):
+        value = StringVar()
+        value.set(v)
+        value.trace("w", partial(self.on_font_variable, name))
+
+        left = Label(self.frame, text=name, anchor=W)
+        right = Button(self.frame, text=v, command=partial(self.on_font_button, name))
+        left.grid(row=self.current_row, column=0, sticky=E + W, pady=0)
+        right.grid(row=self.current_row, column=1, sticky=E + W, pady=0)
+
+        self.current_row += 1
+
+        return right, value
+
+    def create_color_option(self, name, v):
+        value = StringVar()
+        value.set(v)
+        value.trace("w", partial(self.on_color_variable, name))
+
+        left = Label(self.frame, text=name, anchor=W)
+        right = Button(self.frame, bg=value.get(), width=4, command=partial(self.on_color_button, name))
+        left.grid(row=self.current_row, column=0, sticky=E + W, pady=0)
+        right.grid(row=self.current_row, column=1, sticky=E + W, pady=0)
+
+        self.current_row += 1
+
+        return right, value
+
+    def create_path_option(self, name, v):
+        value = StringVar()
+
+        value.set(v)
+        value.trace("w", partial(self.on_path_variable, name))
+
+        left = Label(self.frame, text=name, anchor=W)
+        right = Button(self.frame, textvariable=value, command=partial(self.on_path_button, name))
+        left.grid(row=self.current_row, column=0, sticky=E + W, pady=0)
+        right.grid(row=self.current_row, column=1, sticky=E + W, pady=0)
+
+        self.current_row += 1
+
+        return right, value
+
+    def on_int_variable(self, name, *args):
+        c, v = self.controls[name]
+        self.set_opt_int(name, v.get())
+
+        self.apply_prop_changed(name)
+
+    def on_text_variable(self, name, *args):
+        c, v = self.controls[name]
+        self.set_opt(name, v.get())
+
+        self.apply_prop_changed(name)
+
+    def on_font_variable(self, name, *args):
+        c, v = self.controls[name]
+        self.set_opt_font(name, v.get())
+        c.configure(text=v.get())
+
+        self.apply_prop_changed(name)
+
+    def on_color_variable(self, name, *args):
+        c, v = self.controls[name]
+        self.set_opt(name, v.get())
+        c.configure(bg=v.get())
+
+        self.apply_prop_changed(name)
+
+    def on_path_variable(self, name, *args):
+        c, v = self.controls[name]
+        self.set_opt(name, v.get())
+        c.configure(text=v.get())
+
+        self.apply_prop_changed(name)
+
+    def update_control_value(self, t, name, value):
+        print('update_control_value', t, name, value)
+        c, v = self.controls[name]
+        if t == 'int':
+            v.set(value[2])
+        elif t in ['text', 'font', 'color', 'path']:
+            v.set(value)
+        else:
+            raise Exception('Unknown option type')
+
+    def set_opt(self, n, v):
+        self.settings.set_value(n, v)
+
+    def set_opt_int(self, n, v):
+        self.settings.get_value(n)[2] = v
+
+    def set_opt_font(self, n, v):
+        self.settings.set_value(n, eval(v))
+
+    def get_opt(self, n):
+        return self.settings.get_value(n)
+
+    def on_font_button(self, name):
+        import fontpicker
+
+        s = self.get_opt(name)
+        f = fontpicker.askChooseFont(self.root, defaultfont=tkinter.font.Font(font=tuple(s)))
+        if f:
+            c, v = self.controls[name]
+            v.set(f)
+
+    def on_color_button(self, name):
+        import tkinter.colorchooser
+
+        color = tkinter.colorchooser.askcolor(initialcolor=self.get_opt(name))[1]
+        if color:
+            c, v = self.controls[name]
+            v.set(color)
+
+    def on_path_button(self, name):
+        import tkinter.filedialog
+        from PIL import ImageTk, Image
+
+        file_path = tkinter.filedialog.askopenfilename(filetypes=(("Image files", "*.*"),))
+        print(file_path)
+        if not len(file_path):
+            return
+        try:
+            image = Image.open(file_path)
+            ImageTk.PhotoImage(image)
+        except:
+            tkinter.messagebox.showerror(title='Image load error',
+                                         message='Invalid image, please choose a valid image file')
+            return
+
+        c, v = self.controls[name]
+        v.set(os.path.abspath(file_path))
+
+    def on_cancel(self):
+        if self.dirty:
+            if not tkinter.messagebox.askokcancel("Quit", "Do you want to quit without saving?"):
+                return
+
+            changed = self.settings.diff(self.parent.settings)
+            self.settings = copy.deepcopy(self.parent.settings)
+            self._changed.update(changed)
+            self.flush_prop_changed()
+
+        self.cancel_pending_apply()
+        self.parent.set_setting_button_enabled(True)
+        self.root.destroy()
+
+    def on_default(self):
+        changed = self.settings.diff(self.parent.def_settings)
+        self.settings = copy.deepcopy(self.parent.def_settings)
+
+        self.mute_notify = True
+        for s in self.settings:
+            n = s[0]
+            t = s[1]
+            v = s[2]
+            self.update_control_value(t, n, v)
+        self.mute_notify = False
+
+        self._changed.update(changed)
+        self.apply_prop_changed()
+
+    def on_save(self):
+        self.flush_prop_changed()
+        self.parent.settings = self.settings
+        self.parent.save_settings()
+        self.parent.set_setting_button_enabled(True)
+        self.root.destroy()
+
+    def apply_prop_changed(self, name=None):
+        if self.mute_notify:
+            return
+
+        if name is not None:
+            self._changed.add(self.settings.index_of(name))
+
+        self.dirty = True
+        self.update_title()
+
+        # applied once per frame, however many traces fired in between
+        if self._apply_id is None:
+            self._apply_id = self.root.after(SETTINGS_APPLY_DELAY, self.flush_prop_changed)
+
+    def cancel_pending_apply(self):
+        if self._apply_id is not None:
+            self.root.after_cancel(self._apply_id)
+            self._apply_id = None
+
+    def flush_prop_changed(self):
+        self.cancel_pending_apply()
+
+        if not self._changed:
+            return
+
+        changed = self._changed
+        self._changed = set()
+        #print('on_prop_changed', changed)
+        self.parent.on_setting_changed(self.settings, changed)
+
+    def update_title(self):
+        if self.dirty:
+            self.root.title('Settings *')
+        else:
+            self.root.title('Settings')
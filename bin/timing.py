@@ -0,0 +1,30 @@
+# -*- coding: utf-8 -*-
+
+# Startup phase timer
+#
+# Phases are marked as startup goes along; the report lists how long each
+# phase took and the time since this module was first imported.
+
+
+import time
+
+
+class PhaseTimer(object):
+    def __init__(self):
+        self.origin = time.perf_counter()
+        self.phases = []
+        self._last = self.origin
+
+    def mark(self, name):
+        now = time.perf_counter()
+        self.phases.append((name, now - self._last, now - self.origin))
+        self._last = now
+
+    def report(self):
+        lines = ['%-20s %9s %9s' % ('phase', 'ms', 'total ms')]
+        for name, elapsed, total in self.phases:
+            lines.append('%-20s %9.1f %9.1f' % (name, elapsed * 1000, total * 1000))
+        return '\n'.join(lines)
+
+
+STARTUP = PhaseTimer()